@@ -1,13 +1,19 @@
-# import heapq
+import asyncio
+import heapq
+import itertools
 import threading
 import time
 
 class LEDcontroller:
-    def __init__(self, pwm_channels, inverted=False, update_rate=0.05):
+    def __init__(self, pwm_channels, inverted=False, update_rate=0.05, start=True, preemptive=True, frame_writer=None):
         """
         pwm_channels: tuple/list of 3 PWM objects (R, G, B)
         inverted: bool or tuple/list of bools (one per channel)
-        update_rate: seconds between pattern updates
+        update_rate: seconds between checks for new jobs (non-preemptive loop only)
+        start: start the control thread (False when another runtime steps the jobs)
+        preemptive: wait on job changes, so a new top job cuts the current step's wait short
+        frame_writer: optional callable taking the 3 duties, to commit a changed frame in one call
+                      instead of a ChangeDutyCycle per channel
         """
         if not isinstance(pwm_channels, (tuple, list)) or len(pwm_channels) != 3:
             raise ValueError("pwm_channels must be a tuple/list of 3 PWM objects (R, G, B)")
@@ -20,23 +26,63 @@ class LEDcontroller:
             self.inverted = inverted
         else:
             self.inverted = (inverted, inverted, inverted)
+
+        # last duty written to each channel, writes of an unchanged duty are skipped
+        self.frame_writer = frame_writer
+        self.duty_cache = [None, None, None]
+        self.writes_issued = 0
+        self.writes_suppressed = 0
+        self.frames_committed = 0
+        self.steps = 0  # job steps taken
         
         self.update_rate = update_rate
         self.lock = threading.Lock()
         self.jobs = {}  # {job_id: (priority, generator)}
+        # max-priority heap of (-priority, order, seq, job_id, generator), entries
+        # whose generator is no longer in self.jobs are dropped when they surface
+        self.heap = []
+        self.order = {}  # job_id -> first push, equal priorities go to the earliest job
+        self.sequence = itertools.count()
+        self.changed = threading.Condition(self.lock)  # notified on every job change
+        self.preemptive = preemptive
         self.active = True
-        self.thread = threading.Thread(target=self._run, daemon=True)
-        self.thread.start()
+        self.thread = None
+        if start:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
 
     # -----------------------------
     # LED hardware interface
     # -----------------------------
     def _apply_rgb(self, r, g, b):
-        """Directly set RGB LED brightness values (0–100)."""
+        """Set RGB LED brightness values (0–100), writing only channels that changed."""
         channels = [r, g, b]
+        duties = [100 - channels[i] if self.inverted[i] else channels[i] for i in range(3)]
+        cache = self.duty_cache
+        if self.frame_writer:
+            if duties == cache:
+                self.writes_suppressed += 3
+                return
+            self.frame_writer(duties)
+            self.duty_cache = duties
+            self.frames_committed += 1
+            self.writes_issued += 3
+            return
+        changed = False
         for i, pwm in enumerate(self.pwm_channels):
-            duty = 100 - channels[i] if self.inverted[i] else channels[i]
-            pwm.ChangeDutyCycle(duty)
+            if duties[i] == cache[i]:
+                self.writes_suppressed += 1
+                continue
+            pwm.ChangeDutyCycle(duties[i])
+            cache[i] = duties[i]
+            self.writes_issued += 1
+            changed = True
+        if changed:
+            self.frames_committed += 1
+
+    def output_stats(self):
+        """(channel writes issued, channel writes suppressed, frames committed)"""
+        return self.writes_issued, self.writes_suppressed, self.frames_committed
 
     # -----------------------------
     # Job control
@@ -44,54 +90,178 @@ class LEDcontroller:
     def push_job(self, job_id, priority, generator_func):
         """
         Add or replace a job.
-        generator_func must be a generator function that yields repeatedly.
+        generator_func must be a generator function that yields repeatedly,
+        each yield giving the seconds to wait before the next step (None for no wait).
         """
         with self.lock:
-            self.jobs[job_id] = (priority, generator_func(self))
-            # sort jobs implicitly by priority when choosing active job
+            generator = generator_func(self)
+            self.jobs[job_id] = (priority, generator)
+            order = self.order.setdefault(job_id, next(self.sequence))
+            heapq.heappush(self.heap, (-priority, order, next(self.sequence), job_id, generator))
+            if len(self.heap) > 2 * len(self.jobs) + 16:
+                # mostly replaced / removed entries, rebuild
+                self.heap = [e for e in self.heap if self.jobs.get(e[3], (None, None))[1] is e[4]]
+                heapq.heapify(self.heap)
+            self._notify()
 
     def remove_job(self, job_id):
         """Remove a job by its ID."""
         with self.lock:
             if job_id in self.jobs:
                 del self.jobs[job_id]
+                del self.order[job_id]
+                self._notify()
+
+    def job_count(self):
+        with self.lock:
+            return len(self.jobs)
 
     def clear_jobs(self):
         with self.lock:
             self.jobs.clear()
+            self.order.clear()
+            self.heap.clear()
+            self._notify()
+
+    def _notify(self):
+        # caller holds self.lock, wakes the control loop after a job change
+        self.changed.notify()
 
     # -----------------------------
     # Main loop
     # -----------------------------
+    def _top_job(self):
+        """Generator of the highest-priority job, or None."""
+        with self.lock:
+            return self._peek()
+
+    def _peek(self):
+        # caller holds self.lock
+        while self.heap:
+            _, _, _, job_id, generator = self.heap[0]
+            entry = self.jobs.get(job_id)
+            if entry is not None and entry[1] is generator:
+                return generator
+            heapq.heappop(self.heap)
+        return None
+
+    def _step(self, job):
+        """Advance a job one step, returns the seconds it asked to wait."""
+        self.steps += 1
+        try:
+            return next(job) or 0  # advance one step
+        except StopIteration:
+            # finished pattern; remove automatically
+            with self.lock:
+                for jid, (_, gen) in list(self.jobs.items()):
+                    if gen is job:
+                        del self.jobs[jid]
+                        del self.order[jid]
+                        break
+        except Exception as e:
+            print(f"[LEDController] Job error: {e}")
+        return 0
+
     def _run(self):
         """Main LED control loop."""
+        if self.preemptive:
+            self._run_preemptive()
+            return
         while self.active:
-            with self.lock:
-                if not self.jobs:
-                    job = None
-                else:
-                    # get highest-priority job
-                    job = max(self.jobs.items(), key=lambda kv: kv[1][0])[1][1]
-
+            job = self._top_job()
             if job:
-                try:
-                    next(job)  # advance one step
-                except StopIteration:
-                    # finished pattern; remove automatically
-                    with self.lock:
-                        for jid, (_, gen) in list(self.jobs.items()):
-                            if gen is job:
-                                del self.jobs[jid]
-                                break
-                except Exception as e:
-                    print(f"[LEDController] Job error: {e}")
+                delay = self._step(job)
+                # wait out the delay in update_rate slices, so a new top job still gets a look in
+                deadline = time.monotonic() + delay
+                while self.active and self._top_job() is job:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(remaining, self.update_rate))
             else:
                 time.sleep(self.update_rate)
         print("LED controller stopped")
 
+    def _run_preemptive(self):
+        """Step the top job, then wait out its delay unless a different job takes over."""
+        current = None
+        deadline = 0
+        while self.active:
+            job = self._top_job()
+            if job is None:
+                current = None
+                with self.lock:
+                    if self.active and self._peek() is None:
+                        self.changed.wait()
+                continue
+            if job is not current or time.monotonic() >= deadline:
+                # a newly promoted job runs straight away, the current one once its delay is up
+                current = job
+                deadline = time.monotonic() + self._step(job)
+            with self.lock:
+                remaining = deadline - time.monotonic()
+                if remaining > 0 and self.active and self._peek() is current:
+                    self.changed.wait(remaining)
+        print("LED controller stopped")
+
+    def stop(self):
+        with self.lock:
+            self.active = False
+            self._notify()
+        if self.thread:
+            self.thread.join()
+
+class AsyncLEDcontroller(LEDcontroller):
+    """
+    LEDcontroller whose jobs are stepped by a task on an asyncio event loop
+    instead of a thread. push_job/remove_job may be called from any thread.
+    """
+    def __init__(self, pwm_channels, inverted=False, update_rate=0.05):
+        super().__init__(pwm_channels, inverted, update_rate, start=False)
+        self.loop = None
+        self.wakeup = None # asyncio.Event, set on every job change once started
+        self.task = None
+
+    def start(self):
+        """Start stepping jobs, must be called from inside the running loop."""
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self.task = self.loop.create_task(self.run())
+        return self.task
+
+    def _notify(self):
+        # jobs pushed before start() are picked up when run() first looks
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    async def run(self):
+        """Step the top job, then wait out its delay unless the job list changes."""
+        current = None
+        deadline = 0
+        while self.active:
+            self.wakeup.clear()
+            job = self._top_job()
+            if job is None:
+                current = None
+                await self.wakeup.wait()
+                continue
+            if job is not current or self.loop.time() >= deadline:
+                # a newly promoted job runs straight away, the current one once its delay is up
+                current = job
+                deadline = self.loop.time() + self._step(job)
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        print("LED controller stopped")
+
     def stop(self):
         self.active = False
-        self.thread.join()
+        self._notify()
 
 # ---------------------------
 # LED job functions
@@ -112,18 +282,15 @@ def pulse_green(led):
         brightness += direction
         if brightness >= 100 or brightness <= 0:
             direction *= -1
-        time.sleep(0.02)
-        yield  # yield every small step
+        yield 0.02  # yield every small step
 
 def flash_blue(led):
     """Quick flash sequence."""
     for _ in range(4):
         led._apply_rgb(0, 0, 100)
-        time.sleep(0.1)
-        yield
+        yield 0.1
         led._apply_rgb(0, 0, 0)
-        time.sleep(0.1)
-        yield
+        yield 0.1
     # stop automatically after a few flashes
 
 if __name__ == "__main__":
@@ -0,0 +1,151 @@
+from array import array
+from functools import lru_cache
+
+# ---- NumPy for vectorised colour maths, pure Python fallback ----
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# -----------------------------
+# Keyframe segments
+# -----------------------------
+# A pattern is a list of segments, each rendered into one or more frames of
+# (R, G, B) held for a duration. Colours are 0-100 as for LEDcontroller._apply_rgb.
+
+def hold(rgb, seconds):
+    """Constant colour."""
+    return ("hold", tuple(rgb), seconds)
+
+def rgb_ramp(start, end, seconds, frames):
+    """Linear fade between two RGB colours over `frames` frames."""
+    return ("rgb_ramp", tuple(start), tuple(end), seconds, frames)
+
+def hue_sweep(start_hue, end_hue, seconds, frames, saturation=1, value=1):
+    """Walk round the colour wheel, hues in degrees (may exceed 360), end_hue exclusive."""
+    return ("hue_sweep", start_hue, end_hue, seconds, frames, saturation, value)
+
+# -----------------------------
+# Colour maths
+# -----------------------------
+def hsv_to_rgb(hues, saturation=1, value=1):
+    """Vectorised HSV -> RGB (0-100) for a sequence of hues in degrees, returns a list of (R, G, B)."""
+    if np is not None:
+        h = np.asarray(hues, dtype=np.float64)
+        chroma = value * saturation
+        x = chroma * (1 - np.abs((h / 60) % 2 - 1))
+        m = value - chroma
+        sector = (h // 60).astype(np.int64) % 6
+        zero = np.zeros_like(h)
+        c = np.full_like(h, chroma)
+        r = np.choose(sector, [c, x, zero, zero, x, c])
+        g = np.choose(sector, [x, c, c, x, zero, zero])
+        b = np.choose(sector, [zero, zero, x, c, c, x])
+        return ((np.stack([r, g, b], axis=1) + m) * 100).tolist()
+    rgb = []
+    for hue in hues:
+        chroma = value * saturation
+        x = chroma * (1 - abs((hue / 60) % 2 - 1))
+        m = value - chroma
+        sector = int(hue // 60) % 6
+        r, g, b = ((chroma, x, 0), (x, chroma, 0), (0, chroma, x),
+                   (0, x, chroma), (x, 0, chroma), (chroma, 0, x))[sector]
+        rgb.append([(r + m) * 100, (g + m) * 100, (b + m) * 100])
+    return rgb
+
+def apply_gamma(colours, gamma):
+    """Perceptual correction, 100 * (c / 100) ** gamma on every channel."""
+    if np is not None:
+        return (100 * (np.asarray(colours, dtype=np.float64) / 100) ** gamma).tolist()
+    return [[100 * (c / 100) ** gamma for c in rgb] for rgb in colours]
+
+# -----------------------------
+# Compiler
+# -----------------------------
+class FrameTable:
+    """
+    Compiled pattern: flat float32 arrays of colours (R, G, B per frame) and
+    frame durations. Consecutive identical frames are merged.
+    """
+    def __init__(self, colours, durations):
+        self.colours = colours      # array('f'), 3 entries per frame
+        self.durations = durations  # array('f'), seconds per frame
+
+    def __len__(self):
+        return len(self.durations)
+
+    @property
+    def duration(self):
+        return sum(self.durations)
+
+    def play(self, led):
+        """Generator for LEDcontroller.push_job, one job plays the whole table."""
+        colours = self.colours
+        durations = self.durations
+        for i in range(len(durations)):
+            led._apply_rgb(colours[3 * i], colours[3 * i + 1], colours[3 * i + 2])
+            yield durations[i]
+
+def render_segment(segment):
+    """(list of (R, G, B), list of durations) for one segment."""
+    kind = segment[0]
+    if kind == "hold":
+        _, rgb, seconds = segment
+        return [rgb], [seconds]
+    if kind == "rgb_ramp":
+        _, start, end, seconds, frames = segment
+        steps = [i / max(frames - 1, 1) for i in range(frames)]
+        if np is not None:
+            t = np.asarray(steps)[:, None]
+            colours = (np.asarray(start) * (1 - t) + np.asarray(end) * t).tolist()
+        else:
+            colours = [[s + (e - s) * t for s, e in zip(start, end)] for t in steps]
+        return colours, [seconds / frames] * frames
+    if kind == "hue_sweep":
+        _, start_hue, end_hue, seconds, frames, saturation, value = segment
+        step = (end_hue - start_hue) / frames
+        return hsv_to_rgb([start_hue + i * step for i in range(frames)], saturation, value), [seconds / frames] * frames
+    raise ValueError(f"Unknown keyframe segment {kind!r}")
+
+def compile_pattern(segments, gamma=None):
+    """Render keyframe segments ahead of time into a FrameTable."""
+    colours = []
+    durations = []
+    for segment in segments:
+        c, d = render_segment(segment)
+        colours.extend(c)
+        durations.extend(d)
+    if gamma:
+        colours = apply_gamma(colours, gamma)
+    flat = array("f")
+    merged = array("f")
+    previous = None
+    for rgb, seconds in zip(colours, durations):
+        rgb = tuple(rgb)
+        if rgb == previous:
+            merged[-1] += seconds
+            continue
+        flat.extend(rgb)
+        merged.append(seconds)
+        previous = rgb
+    return FrameTable(flat, merged)
+
+# -----------------------------
+# Compiled standard patterns
+# -----------------------------
+@lru_cache(maxsize=None)
+def flash_table(rgb, flashes=3, on=0.5, off=0.5):
+    return compile_pattern([hold(rgb, on), hold((0, 0, 0), off)] * flashes)
+
+@lru_cache(maxsize=None)
+def heartbeat_table(alertLevel):
+    # no alert: brief green; recoverable: medium amber; serious: long red
+    flash = {0: ((0, 4, 0), 0.1), 1: ((4, 2, 0), 0.3), 2: ((4, 0, 0), 0.5)}.get(alertLevel)
+    segments = [hold(*flash)] if flash else []
+    return compile_pattern(segments + [hold((0, 0, 0), 0)])
+
+@lru_cache(maxsize=None)
+def post_table():
+    # power-on self test: one and a bit turns of the colour wheel (180 to 840 degrees,
+    # 2 degree steps, 10 ms each), then three bright green flashes
+    return compile_pattern([hue_sweep(180, 842, 3.31, 331)] + [hold((0, 100, 0), 0.5), hold((0, 0, 0), 0.5)] * 3)
@@ -1,73 +1,53 @@
-import time
+import LEDframes
+
+# pattern generators yield the number of seconds to hold the current output
+# before the next step, the LED controller does the waiting
+# fixed sequences are compiled frame tables (LEDframes) played back as one job
+
+# seconds a static colour holds before it is re-applied; the controller switches
+# straight away when the job list changes, so this only bounds idle wakeups
+STATIC_HOLD = 60
 
 def solid_colour(led, RGB):
     while True:
         led._apply_rgb(RGB[0], RGB[1], RGB[2])
-        time.sleep(0.1)
-        yield
+        yield STATIC_HOLD
 
 def next_bin(led, RGB, days):
     # assign the bin indicator next bin colour
     led._apply_rgb(RGB[0], RGB[1], RGB[2])
-    time.sleep(2)
-    yield
+    yield 2
     for i in range(days):
         # flash the bin indicator to show how many days ahead
         led._apply_rgb(0, 0, 0)
-        time.sleep(0.3)
+        yield 0.3
         led._apply_rgb(RGB[0], RGB[1], RGB[2])
-        time.sleep(0.3)
-        yield
+        yield 0.3
     led._apply_rgb(0, 0, 0)
     led.remove_job("user_request_next_bin")
 
 def turn_off(led):
     while True:
         led._apply_rgb(0, 0, 0)
-        time.sleep(0.1)
-        yield
+        yield STATIC_HOLD
 
 def heartbeat(led, alertLevel):
-    if alertLevel == 0:
-        # no alert, briefly flash green
-        led._apply_rgb(0,4,0)
-        time.sleep(0.1)
-    if alertLevel == 1:
-        # recoverable issue, medium amber flash
-        led._apply_rgb(4,2,0)
-        time.sleep(0.3)
-    if alertLevel == 2:
-        # serious issue, long red flash
-        led._apply_rgb(4,0,0)
-        time.sleep(0.5)
-    led._apply_rgb(0,0,0)
-    led.remove_job("heartbeat")
-    yield
+    # no alert: brief green flash, recoverable issue: medium amber, serious issue: long red
+    return LEDframes.heartbeat_table(alertLevel).play(led)
 
 def success(led, brightness=30):
-    for i in range(3):
-        led._apply_rgb(0,brightness,0)
-        time.sleep(0.5)
-        yield
-        led._apply_rgb(0,0,0)
-        time.sleep(0.5)
-        yield
-    led.remove_job("success")
+    return LEDframes.flash_table((0, brightness, 0)).play(led)
 
 def error(led, brightness=30):
-    for i in range(3):
-        led._apply_rgb(brightness,0,0)
-        time.sleep(0.5)
-        yield
-        led._apply_rgb(0,0,0)
-        time.sleep(0.5)
-        yield
-    led.remove_job("error")
+    return LEDframes.flash_table((brightness, 0, 0)).play(led)
+
+def post(led):
+    # colour wheel sweep then green flashes, compiled once
+    return LEDframes.post_table().play(led)
 
 def web_activity(led):
     while True:
         led._apply_rgb(0,0,10)
-        time.sleep(0.05)
+        yield 0.05
         led._apply_rgb(0,0,0)
-        time.sleep(0.05)
-        yield
\ No newline at end of file
+        yield 0.05
@@ -0,0 +1,164 @@
+import heapq
+import itertools
+import time
+
+from LEDcontroller import LEDcontroller
+
+class VirtualClock:
+    """Simulated time in seconds, only moves when advanced."""
+    def __init__(self, start=0.0):
+        self.seconds = start
+
+    def __call__(self):
+        return self.seconds
+
+    def advance_to(self, t):
+        self.seconds = max(self.seconds, t)
+
+class RecordingPWM:
+    """PWM sink that records (time, duty) for every ChangeDutyCycle against a clock."""
+    def __init__(self, clock):
+        self.clock = clock
+        self.duty_cycle = 0
+        self.writes = []
+
+    def start(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+
+    def ChangeDutyCycle(self, duty_cycle):
+        self.duty_cycle = duty_cycle
+        self.writes.append((self.clock(), duty_cycle))
+
+class VirtualLEDcontroller(LEDcontroller):
+    """
+    LEDcontroller stepped against a VirtualClock instead of a thread, following the
+    same preemptive rules: the top job runs its steps, a different top job runs at once.
+    Several controllers can share one clock, see step_due / next_time.
+    script: entries added with at(time, action, *args), action "push" (job_id, priority,
+            generator_func), "remove" (job_id) or "clear", applied when the clock reaches time.
+    frame_writer: also given every changed frame; record=False leaves the frames to it alone
+                  (no trace), for long simulations
+    """
+    def __init__(self, inverted=False, clock=None, max_steps=1_000_000, frame_writer=None, record=True):
+        self.clock = clock or VirtualClock()
+        self.record = record
+        self.sink = frame_writer
+        pwms = tuple(RecordingPWM(self.clock) for _ in range(3))
+        super().__init__(pwms, inverted, start=False, frame_writer=self._write_frame if frame_writer else None)
+        self.max_steps = max_steps
+        self.script = []
+        self.script_order = itertools.count()
+        self.current = None
+        self.deadline = 0.0
+
+    def _write_frame(self, duties):
+        if self.record:
+            for pwm, duty in zip(self.pwm_channels, duties):
+                pwm.ChangeDutyCycle(duty)
+        self.sink(duties)
+
+    def at(self, t, action, *args):
+        heapq.heappush(self.script, (t, next(self.script_order), action, args))
+        return self
+
+    def _apply_script(self):
+        while self.script and self.script[0][0] <= self.clock.seconds:
+            _, _, action, args = heapq.heappop(self.script)
+            if action == "push":
+                self.push_job(*args)
+            elif action == "remove":
+                self.remove_job(*args)
+            elif action == "clear":
+                self.clear_jobs()
+            else:
+                raise ValueError(f"Unknown script action {action!r}")
+
+    def step_due(self):
+        """Apply due script entries and step the top job until it asks to wait, returns the steps taken."""
+        for steps in range(self.max_steps):
+            self._apply_script()
+            job = self._top_job()
+            if job is None:
+                self.current = None
+                return steps
+            if job is self.current and self.clock.seconds < self.deadline:
+                return steps
+            # a newly promoted job runs straight away, the current one once its delay is up
+            self.current = job
+            self.deadline = self.clock.seconds + self._step(job)
+        raise RuntimeError(f"Pattern did not settle within {self.max_steps} steps")
+
+    def next_time(self):
+        """Clock time this controller next needs stepping, None when idle with nothing scripted.
+        Jobs pushed from outside the script need a step_due() straight after."""
+        times = [self.deadline] if self.current is not None else []
+        if self.script:
+            times.append(self.script[0][0])
+        return min(times, default=None)
+
+    def run(self, until=None):
+        """Run until `until` seconds, or until there are no jobs and no script left."""
+        while True:
+            self.step_due()
+            next_time = self.next_time()
+            if next_time is None:
+                return self
+            if until is not None and next_time > until:
+                self.clock.advance_to(until)
+                return self
+            self.clock.advance_to(next_time)
+
+    def trace(self):
+        """[(time_us, duty_r, duty_g, duty_b)] after every change of output."""
+        if not self.record:
+            raise RuntimeError("Output not recorded (record=False), the frames went to the frame_writer only")
+        events = sorted((t, i, duty) for i, pwm in enumerate(self.pwm_channels) for t, duty in pwm.writes)
+        trace = []
+        duties = [None, None, None]
+        for t, i, duty in events:
+            duties[i] = duty
+            t_us = round(t * 1_000_000)
+            if trace and trace[-1][0] == t_us:
+                trace[-1] = (t_us, *duties)
+            else:
+                trace.append((t_us, *duties))
+        return trace
+
+def render_pattern(generator_func, until=None, inverted=False):
+    """Timestamped output trace of one pattern on its own."""
+    led = VirtualLEDcontroller(inverted)
+    led.at(0, "push", "pattern", 1, generator_func)
+    return led.run(until).trace()
+
+def render_jobs(script, until=None, inverted=False):
+    """Timestamped output trace of a scripted set of job pushes/removals."""
+    led = VirtualLEDcontroller(inverted)
+    for entry in script:
+        led.at(*entry)
+    return led.run(until).trace()
+
+# Main execution
+if __name__ == '__main__':
+    # render the standard patterns and report how long it took
+    import LEDpatterns
+    patterns = {
+        "POST": LEDpatterns.post,
+        "success": LEDpatterns.success,
+        "error": LEDpatterns.error,
+        "heartbeat level 2": lambda led: LEDpatterns.heartbeat(led, 2),
+        "next_bin 13 days": lambda led: LEDpatterns.next_bin(led, (100, 0, 100), 13),
+        "web_activity 10 s": LEDpatterns.web_activity,
+    }
+    for name, pattern in patterns.items():
+        start = time.perf_counter()
+        trace = render_pattern(pattern, until=10)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {len(trace)} output changes over {trace[-1][0] / 1e6:.2f} s simulated, rendered in {elapsed * 1e3:.2f} ms")
+    start = time.perf_counter()
+    trace = render_jobs([(0, "push", "defaultOff", 1, LEDpatterns.turn_off),
+                         (0.5, "push", "next", 50, lambda led: LEDpatterns.next_bin(led, (0, 0, 100), 3)),
+                         (1.0, "push", "error", 60, LEDpatterns.error),
+                         (2.0, "remove", "error")], until=10)
+    print(f"preemption script: {len(trace)} output changes, rendered in {(time.perf_counter() - start) * 1e3:.2f} ms")
+    for entry in trace:
+        print(entry)
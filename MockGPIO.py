@@ -1,36 +1,86 @@
 import sys
+import os
+import json
 import time
 import threading
 import math
+from array import array
+
+# MOCKGPIO_HEADLESS=1: no prints and no bar graph, PWM changes go to a trace buffer instead
+# MOCKGPIO_SCRIPT=file.json: [[seconds, pin, level], ...] button edges played to the pin's callbacks
+HEADLESS = os.environ.get("MOCKGPIO_HEADLESS") == "1"
+SCRIPT_PATH = os.environ.get("MOCKGPIO_SCRIPT")
+TRACE_SIZE = 65536 # PWM changes kept by the headless trace buffer
+
+class PWMTrace:
+    """Ring buffer of (time, pin, duty) PWM changes in flat arrays, oldest overwritten."""
+    def __init__(self, size=TRACE_SIZE, clock=time.monotonic):
+        self.size = size
+        self.clock = clock
+        self.times = array("d", bytes(8 * size))
+        self.pins = array("H", bytes(2 * size))
+        self.duties = array("f", bytes(4 * size))
+        self.count = 0 # changes recorded in total
+        self.lock = threading.Lock()
+
+    def record(self, pin, duty):
+        with self.lock:
+            i = self.count % self.size
+            self.times[i] = self.clock()
+            self.pins[i] = pin
+            self.duties[i] = duty
+            self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.size)
+
+    def records(self):
+        """[(time, pin, duty)] still held, oldest first."""
+        with self.lock:
+            start = max(0, self.count - self.size)
+            return [(self.times[i % self.size], self.pins[i % self.size], self.duties[i % self.size])
+                    for i in range(start, self.count)]
+
+    def clear(self):
+        with self.lock:
+            self.count = 0
 
 class MockPWM:
-    def __init__(self, pin, frequency, display=None):
-        print(f"[MockGPIO] Creating PWM on pin {pin} at {frequency}Hz")
+    def __init__(self, pin, frequency, display=None, trace=None, quiet=False):
+        self.quiet = quiet
+        self._log(f"[MockGPIO] Creating PWM on pin {pin} at {frequency}Hz")
         self.pin = pin
         self.frequency = frequency
         self.duty_cycle = 0
         self.display = display
+        self.trace = trace
+
+    def _log(self, message):
+        if not self.quiet:
+            print(message)
 
     def start(self, duty_cycle):
         self.duty_cycle = duty_cycle
         self.running = True
-        print(f"[MockPWM] Started PWM on pin {self.pin} at {self.frequency}Hz with duty cycle {self.duty_cycle}%")
+        self._log(f"[MockPWM] Started PWM on pin {self.pin} at {self.frequency}Hz with duty cycle {self.duty_cycle}%")
 
     def ChangeDutyCycle(self, duty_cycle):
         if not self.running:
-            print("[MockPWM] Warning: PWM not started yet")
+            self._log("[MockPWM] Warning: PWM not started yet")
         self.duty_cycle = duty_cycle
+        if self.trace is not None:
+            self.trace.record(self.pin, duty_cycle)
         self._update_display()
 
     def ChangeFrequency(self, frequency):
         if not self.running:
-            print("[MockPWM] Warning: PWM not started yet")
+            self._log("[MockPWM] Warning: PWM not started yet")
         self.frequency = frequency
-        print(f"[MockPWM] Changed frequency on pin {self.pin} to {self.frequency}Hz")
+        self._log(f"[MockPWM] Changed frequency on pin {self.pin} to {self.frequency}Hz")
 
     def stop(self):
         self.running = False
-        print(f"[MockPWM] Stopped PWM on pin {self.pin}")
+        self._log(f"[MockPWM] Stopped PWM on pin {self.pin}")
 
     def _update_display(self):
         """Tell the shared display about any change."""
@@ -65,43 +115,116 @@ class MockGPIO:
     HIGH = 1
     LOW = 0
 
-    def __init__(self):
+    def __init__(self, headless=HEADLESS, script_path=SCRIPT_PATH, trace_size=TRACE_SIZE):
+        """
+        headless: no prints and no terminal bar graph, PWM changes are recorded in self.trace
+        script_path: JSON list of [seconds, pin, level] edges, played in real time once
+                     a callback is registered on the pin
+        """
         self.mode = None
         self.pins = {}
-        self.display = LEDBarDisplay(refresh_rate=0.2)
+        self.quiet = headless
+        self.display = None if headless else LEDBarDisplay(refresh_rate=0.2)
+        self.trace = PWMTrace(trace_size) if headless else None
+        self.events = {}    # pin -> {"edge", "bouncetime" (s), "last" (time of the last delivered edge)}
+        self.callbacks = {} # pin -> [callback(channel)]
+        self.script = []
+        if script_path:
+            with open(script_path) as f:
+                self.script = sorted(tuple(edge) for edge in json.load(f))
+
+    def _log(self, message):
+        if not self.quiet:
+            print(message)
 
     def setmode(self, mode):
         self.mode = mode
-        print(f"[MockGPIO] Mode set to {mode}")
+        self._log(f"[MockGPIO] Mode set to {mode}")
 
     def setup(self, pin, mode):
         self.pins[pin] = {"mode": mode, "state": self.LOW}
-        print(f"[MockGPIO] Pin {pin} set up as {mode}")
+        self._log(f"[MockGPIO] Pin {pin} set up as {mode}")
 
     def output(self, pin, state):
         if pin in self.pins and self.pins[pin]["mode"] == self.OUT:
             self.pins[pin]["state"] = state
-            print(f"[MockGPIO] Pin {pin} output set to {state}")
+            self._log(f"[MockGPIO] Pin {pin} output set to {state}")
         else:
-            print(f"[MockGPIO] Error: Pin {pin} not configured as OUT")
+            self._log(f"[MockGPIO] Error: Pin {pin} not configured as OUT")
 
     def input(self, pin):
-        state = self.pins.get(pin, {}).get("state", self.LOW)
-        print(f"[MockGPIO] Pin {pin} read as {state}")
-        return state
+        return self.pins.get(pin, {}).get("state", self.LOW)
 
     def PWM(self, pin, frequency):
-        return MockPWM(pin, frequency, self.display)
-    
+        return MockPWM(pin, frequency, self.display, self.trace, self.quiet)
+
     def add_event_detect(self, pin, edge, bouncetime):
-        print(f"[MockGPIO] Add event detect on {pin} edge {edge} with bouncetime {bouncetime}ms")
+        self.events[pin] = {"edge": edge, "bouncetime": bouncetime / 1000, "last": None}
+        self._log(f"[MockGPIO] Add event detect on {pin} edge {edge} with bouncetime {bouncetime}ms")
 
     def add_event_callback(self, pin, callback):
-        print(f"[MockGPIO] Add event callback on {pin} with callback {callback}")
+        self.callbacks.setdefault(pin, []).append(callback)
+        self._log(f"[MockGPIO] Add event callback on {pin} with callback {callback}")
+        script = [edge for edge in self.script if edge[1] == pin]
+        if script and len(self.callbacks[pin]) == 1:
+            self.play(script, background=True)
+
+    # -----------------------------
+    # Input injection
+    # -----------------------------
+    def inject(self, pin, level, t=None):
+        """
+        Drive an input pin to `level` and deliver the edge to the pin's callbacks,
+        as the GPIO library would (edge type and bouncetime from add_event_detect).
+        t: time of the edge for the bounce filter, default time.monotonic()
+        """
+        state = self.pins.setdefault(pin, {"mode": self.IN, "state": self.LOW})
+        if state["state"] == level:
+            return False
+        state["state"] = level
+        event = self.events.get(pin)
+        if event is None:
+            return False
+        if event["edge"] == self.RISING and level != self.HIGH or event["edge"] == self.FALLING and level != self.LOW:
+            return False
+        t = time.monotonic() if t is None else t
+        if event["last"] is not None and t - event["last"] < event["bouncetime"]:
+            return False
+        event["last"] = t
+        for callback in self.callbacks.get(pin, []):
+            callback(pin)
+        return True
+
+    def play(self, script, speed=1.0, clock=None, background=False):
+        """
+        Play [(seconds, pin, level)] edges.
+        speed: real time multiplier, 0 for no waiting at all
+        clock: virtual clock with advance_to(seconds), moved to each edge instead of sleeping
+        background: play on a daemon thread and return it
+        """
+        if background:
+            thread = threading.Thread(target=self.play, args=(script, speed, clock), daemon=True)
+            thread.start()
+            return thread
+        start = time.monotonic()
+        for t, pin, level in sorted(script):
+            if clock is not None:
+                clock.advance_to(t)
+                self.inject(pin, level, t)
+                continue
+            if speed:
+                delay = start + t / speed - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+            self.inject(pin, level, time.monotonic())
 
     def cleanup(self):
         self.pins.clear()
-        print("[MockGPIO] Cleaned up all pins")
+        self._log("[MockGPIO] Cleaned up all pins")
+
+def press(pin, at, held):
+    """Script edges for one press of `held` seconds starting at `at` (active high)."""
+    return [(at, pin, MockGPIO.HIGH), (at + held, pin, MockGPIO.LOW)]
 
 class LEDBarDisplay:
     def __init__(self, num_leds=2, refresh_rate=0.2):
@@ -154,3 +277,61 @@ class LEDBarDisplay:
         if self._thread:
             self._thread.join()
         print("\033[?25h")  # ensure cursor is visible
+
+# Main execution
+if __name__ == '__main__':
+    # headless load test: scripted gestures through main.ButtonHandler on a virtual clock,
+    # then LED patterns stepped flat out into the PWM trace buffer
+    from datetime import datetime
+    os.environ["MOCKGPIO_HEADLESS"] = "1"
+    import main
+    import LEDpatterns
+    from LEDcontroller import LEDcontroller
+    from simulate import SimClock
+
+    gpio = main.GPIO
+    clock = SimClock(datetime.now())
+    main.clock = clock
+    gpio.trace.clock = clock
+    counts = {}
+    handlers = {f"{gesture}_fun": (lambda gesture=gesture: counts.__setitem__(gesture, counts.get(gesture, 0) + 1))
+                for gesture in ("single", "double", "long", "extra_long")}
+    BUTTON_PIN = 5
+    button = main.ButtonHandler(BUTTON_PIN, start=False, **handlers)
+    gpio.setup(BUTTON_PIN, gpio.IN)
+    gpio.add_event_detect(BUTTON_PIN, gpio.BOTH, bouncetime=10)
+    gpio.add_event_callback(BUTTON_PIN, button.edge_detected)
+
+    gestures = 40000
+    script = []
+    for i in range(gestures):
+        t = i * 3.0
+        if i % 4 == 0:
+            script += press(BUTTON_PIN, t, 0.1) # single tap
+        elif i % 4 == 1:
+            script += press(BUTTON_PIN, t, 0.1) + press(BUTTON_PIN, t + 0.2, 0.05) # double tap
+        elif i % 4 == 2:
+            script += press(BUTTON_PIN, t, 0.8) # long press
+        else:
+            script += press(BUTTON_PIN, t, 2.0) # extra long press
+    start = time.perf_counter()
+    gpio.play(script, clock=clock)
+    button.advance(clock.seconds + 10)
+    elapsed = time.perf_counter() - start
+    print(f"{len(script)} scripted edges, {gestures} gestures in {elapsed:.2f} s: {counts}")
+
+    pwms = []
+    for p in (10, 9, 17):
+        gpio.setup(p, gpio.OUT)
+        pwm = gpio.PWM(p, 200)
+        pwm.start(0)
+        pwms.append(pwm)
+    led = LEDcontroller(tuple(pwms), start=False)
+    led.push_job("web", 1, LEDpatterns.web_activity)
+    job = led._top_job()
+    steps = 200000
+    start = time.perf_counter()
+    for _ in range(steps):
+        clock.advance_to(clock.seconds + led._step(job))
+    elapsed = time.perf_counter() - start
+    print(f"{steps} LED steps in {elapsed:.2f} s, {gpio.trace.count} PWM changes traced, last {len(gpio.trace)} kept")
@@ -0,0 +1,305 @@
+import argparse
+import html
+import json
+import os
+import secrets
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from http.cookies import SimpleCookie
+from string import Template
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+INPUT_URL = "/w/webpage/find-bin-collection-day-input-address"
+DETAILS_URL = "/w/webpage/find-bin-collection-day-show-details"
+MAINTENANCE_URL = "/w/webpage/system-maintenance-page"
+AJAX_URL = "/w/ajax"
+
+# week 0 of every collection cycle in bins.json
+CYCLE_ANCHOR = date(2025, 1, 6)
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# request steps, named as in scraper.py
+STEPS = ("r0", "r1", "r2", "r3", "r4", "r5")
+
+def ordinal(day):
+    if 11 <= day % 100 <= 13:
+        return f"{day}th"
+    return f"{day}{ {1: 'st', 2: 'nd', 3: 'rd'}.get(day % 10, 'th')}"
+
+def next_collection(bin_info, today):
+    # first date on or after today that falls on this bin's cycle
+    weekday = WEEKDAYS.index(bin_info["weekday"])
+    day = today + timedelta(days=(weekday - today.weekday()) % 7)
+    while ((day - CYCLE_ANCHOR).days // 7 - bin_info["week_offset"]) % bin_info["interval_weeks"]:
+        day += timedelta(days=7)
+    return day
+
+class MockWasteServer:
+    # local stand-in for waste.nc.north-herts.gov.uk that replays the find-bin-collection-day flow
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, token_lifetime=3600, fixture_path=FIXTURE_PATH):
+        self.latency = latency               # seconds added to every response
+        self.token_lifetime = token_lifetime # seconds before a session's tokens are rejected
+        self.maintenance = False             # redirect the input page to the maintenance page
+        self.malformed = set()               # steps ("r0".."r5") that answer with garbage
+        self.today = None                    # override the date collections are projected from
+        self.sessions = {}
+        self.address_ids = {}
+        self.request_counts = {step: 0 for step in STEPS}
+        self.lock = threading.Lock()
+
+        self.fixtures = {}
+        for name in os.listdir(fixture_path):
+            with open(os.path.join(fixture_path, name), encoding="utf-8") as f:
+                self.fixtures[name] = f.read()
+        self.bins = json.loads(self.fixtures["bins.json"])
+
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def render(self, name, **values):
+        return Template(self.fixtures[name]).substitute(values)
+
+    # -----------------------------
+    # Session state
+    # -----------------------------
+    def new_session(self):
+        session_id = secrets.token_hex(16)
+        with self.lock:
+            self.sessions[session_id] = {
+                "webpage_token": secrets.token_hex(32),
+                "csrf": None,
+                "levels": None,
+                "address": None,
+                "expires": time.time() + self.token_lifetime,
+            }
+        return session_id
+
+    def get_session(self, session_id):
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session and session["expires"] < time.time():
+                del self.sessions[session_id]
+                session = None
+        return session
+
+    def address_id(self, address):
+        # stable integer ID per address, as the council's type-ahead returns
+        with self.lock:
+            return self.address_ids.setdefault(address, str(100000 + len(self.address_ids)))
+
+    def details_fragment(self, address):
+        today = self.today or date.today()
+        rows = []
+        for bin_info in self.bins:
+            day = next_collection(bin_info, today)
+            if bin_info["interval_weeks"] == 1:
+                cycle = f"Every {bin_info['weekday']}"
+            else:
+                cycle = f"Every other {bin_info['weekday']}"
+            rows.append(self.render("details_row.html",
+                                    icon=bin_info["icon"],
+                                    label=bin_info["label"],
+                                    next_collection=f"{WEEKDAYS[day.weekday()]} {ordinal(day.day)} {day:%B %Y}",
+                                    cycle=cycle))
+        return self.render("details_fragment.html", address=html.escape(address), rows="\n".join(rows))
+
+    # -----------------------------
+    # HTTP handling
+    # -----------------------------
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # headers and body leave in one write when handle_one_request flushes: written
+            # separately, Nagle holds the body back until the client's delayed ACK (~40 ms)
+            wbufsize = 2**16
+
+            def log_message(self, format, *args):
+                pass # keep benchmark output clean
+
+            def do_GET(self):
+                server.handle(self, "GET")
+
+            def do_POST(self):
+                server.handle(self, "POST")
+
+        return Handler
+
+    def handle(self, request, method):
+        if self.latency:
+            time.sleep(self.latency)
+        parts = urlsplit(request.path)
+        query = parse_qs(parts.query)
+        length = int(request.headers.get("Content-Length") or 0)
+        form = parse_qs(request.rfile.read(length).decode("utf-8"), keep_blank_values=True) if length else {}
+        form = {k: v[0] for k, v in form.items()}
+        cookie = SimpleCookie(request.headers.get("Cookie", ""))
+        session_id = cookie["session"].value if "session" in cookie else None
+
+        if parts.path == MAINTENANCE_URL:
+            return self.respond(request, 200, self.fixtures["maintenance_page.html"])
+        if self.maintenance:
+            return self.respond(request, 302, "", headers={"Location": MAINTENANCE_URL})
+
+        if parts.path == INPUT_URL and method == "GET":
+            return self.input_page(request)
+        if parts.path == INPUT_URL and "form_check" in form:
+            return self.submit_form(request, session_id, form)
+        if parts.path == INPUT_URL:
+            return self.input_fragment(request, session_id)
+        if parts.path == AJAX_URL and query.get("ajax_action") == ["html_get_type_ahead_results"]:
+            return self.type_ahead(request, session_id, query, form)
+        if parts.path == DETAILS_URL and "_update_page_content_request" in form:
+            return self.details(request, session_id, "r5")
+        if parts.path == DETAILS_URL:
+            return self.details(request, session_id, "r4")
+        return self.respond(request, 404, "<h1>Not found</h1>")
+
+    def respond(self, request, status, body, content_type="text/html; charset=utf-8", headers=None, step=None):
+        if step:
+            with self.lock:
+                self.request_counts[step] += 1
+            if step in self.malformed:
+                # truncated, unparseable body
+                body = body[:len(body) // 3] if body else "<html"
+        payload = body.encode("utf-8")
+        request.send_response(status)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            request.send_header(name, value)
+        request.end_headers()
+        request.wfile.write(payload)
+
+    def respond_json(self, request, status, obj, headers=None, step=None):
+        self.respond(request, status, json.dumps(obj), "application/json", headers, step)
+
+    def rejected(self, request, step):
+        # what the council site does with a stale session: no redirect_url / data in the reply
+        self.respond_json(request, 200, {"error": "Your session has expired. Please reload the page."}, step=step)
+
+    def input_page(self, request):
+        # r0: new session cookie + webpage_token
+        session_id = self.new_session()
+        session = self.get_session(session_id)
+        body = self.render("input_page.html", webpage_token=session["webpage_token"])
+        self.respond(request, 200, body, headers={"Set-Cookie": f"session={session_id}; Path=/; HttpOnly"}, step="r0")
+
+    def input_fragment(self, request, session_id):
+        # r1: CSRF, levels token and the address form
+        session = self.get_session(session_id)
+        if not session:
+            return self.rejected(request, "r1")
+        session["csrf"] = secrets.token_hex(20)
+        session["levels"] = secrets.token_hex(12)
+        data_params = html.escape(json.dumps({"levels": session["levels"], "min_characters": 3}))
+        fragment = self.render("input_fragment.html", csrf=session["csrf"], webpage_token=session["webpage_token"], data_params=data_params)
+        self.respond_json(request, 200, {"data": fragment}, step="r1")
+
+    def type_ahead(self, request, session_id, query, form):
+        # r2: street address -> integer ID
+        session = self.get_session(session_id)
+        if (not session or
+                query.get("webpage_token") != [session["webpage_token"]] or
+                form.get("form_check_ajax") != session["csrf"] or
+                form.get("levels") != session["levels"]):
+            return self.respond(request, 403, "<p>Invalid request</p>", step="r2")
+        address = form.get("search_string", "")
+        body = self.render("type_ahead.html", address_id=self.address_id(address), address=html.escape(address))
+        self.respond(request, 200, body, step="r2")
+
+    def submit_form(self, request, session_id, form):
+        # r3: form submission, answers with the details page redirect
+        session = self.get_session(session_id)
+        if not session or form.get("form_check") != session["csrf"]:
+            return self.rejected(request, "r3")
+        with self.lock:
+            addresses = {v: k for k, v in self.address_ids.items()}
+        address = addresses.get(form.get("context_record_id"))
+        if address is None:
+            return self.rejected(request, "r3")
+        session["address"] = address
+        redirect_url = f"{DETAILS_URL}?webpage_token={session['webpage_token']}"
+        self.respond_json(request, 200, {"redirect_url": redirect_url}, step="r3")
+
+    def details(self, request, session_id, step):
+        # r4: details page shell, r5: details fragment
+        session = self.get_session(session_id)
+        if not session or not session["address"]:
+            return self.rejected(request, step)
+        if step == "r4":
+            return self.respond(request, 200, self.render("details_page.html", webpage_token=session["webpage_token"]), step=step)
+        self.respond_json(request, 200, {"data": self.details_fragment(session["address"])}, step=step)
+
+def benchmark(server, scrapes, workers, per_host):
+    # end-to-end scrape latency and batch throughput against the stand-in server
+    import scraper
+    import batch_scrape
+
+    latencies = []
+    for i in range(scrapes):
+        start = time.perf_counter()
+        scraper.scrape_bin_date_website(f"{i} Test Road, SG6 3JF", scraper.ScrapeContext(cache_path=None, base_url=server.url))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    print(f"Single scrape: median {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+          f"p95 {latencies[int(len(latencies) * 0.95)] * 1000:.1f} ms, max {latencies[-1] * 1000:.1f} ms")
+
+    addresses = [f"{i} Test Road, SG6 3JF" for i in range(scrapes)]
+    start = time.perf_counter()
+    results = batch_scrape.scrape_addresses(addresses, workers, per_host, base_url=server.url)
+    elapsed = time.perf_counter() - start
+    failures = sum(1 for _, error in results.values() if error is not None)
+    print(f"Batch of {scrapes} ({workers} workers, {per_host} per host): {elapsed:.2f} s, "
+          f"{scrapes / elapsed:.1f} addresses/s, {failures} failed")
+    print("Requests served:", server.request_counts)
+
+# Main execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local stand-in for the North Herts bin collection website.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    parser.add_argument("--token-lifetime", type=float, default=3600, help="seconds before session tokens are rejected")
+    parser.add_argument("--maintenance", action="store_true", help="redirect to the maintenance page")
+    parser.add_argument("--malformed", default="", help="comma separated steps (r0-r5) that return garbage")
+    parser.add_argument("--bench", type=int, default=0, metavar="N", help="run N scrapes against the server and exit")
+    parser.add_argument("--workers", type=int, default=4, help="batch benchmark workers")
+    parser.add_argument("--per-host", type=int, default=2, help="batch benchmark requests in flight")
+    args = parser.parse_args()
+
+    server = MockWasteServer(args.host, 0 if args.bench else args.port, args.latency, args.token_lifetime)
+    server.maintenance = args.maintenance
+    server.malformed = {s for s in args.malformed.split(",") if s}
+    server.start()
+    if args.bench:
+        benchmark(server, args.bench, args.workers, args.per_host)
+        server.stop()
+    else:
+        print(f"Serving on {server.url} (point scrape_base_url at it), Ctrl+C to stop.")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            server.stop()
@@ -0,0 +1,63 @@
+import argparse
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import scraper
+import webparser
+
+def scrape_addresses(addresses, max_workers=4, per_host=scraper.MAX_PER_HOST, timeout=scraper.REQUEST_TIMEOUT, cache_dir=None, base_url=None, stream=False):
+    # scrape many addresses concurrently over one shared connection pool
+    # returns {address: (dates, error)} in the order the addresses were given
+    # dates is the webparser.parse_dates dictionary, or None if that address failed
+    addresses = [a.strip() for a in addresses if a.strip()]
+    adapter = scraper.ThrottledAdapter(per_host=per_host, timeout=timeout, pool_maxsize=max(per_host, max_workers))
+
+    def scrape_one(address):
+        cache_path = None
+        if cache_dir:
+            # one token cache per address
+            cache_path = os.path.join(cache_dir, hashlib.sha1(address.encode("utf-8")).hexdigest() + ".json")
+        context = scraper.ScrapeContext(cache_path=cache_path, adapter=adapter, base_url=base_url)
+        if stream:
+            return webparser.parse_dates(scraper.scrape_bin_date_website(address, context, stream=True)[0])
+        source = scraper.scrape_bin_date_website(address, context)
+        return webparser.parse_dates(webparser.parse_bin_table_to_dict(source))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {address: pool.submit(scrape_one, address) for address in addresses}
+        for address, future in futures.items():
+            try:
+                results[address] = (future.result(), None)
+            except Exception as e:
+                results[address] = (None, e)
+    adapter.close()
+    return results
+
+# Main execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape bin collection dates for a list of addresses.")
+    parser.add_argument("address_file", help="text file with one street address per line")
+    parser.add_argument("--workers", type=int, default=4, help="number of addresses scraped at once")
+    parser.add_argument("--per-host", type=int, default=scraper.MAX_PER_HOST, help="maximum requests in flight to the council website")
+    parser.add_argument("--timeout", type=float, default=scraper.REQUEST_TIMEOUT[1], help="per-request timeout, seconds")
+    parser.add_argument("--cache-dir", default=None, help="directory for per-address token caches")
+    parser.add_argument("--base-url", default=None, help="scrape a stand-in server instead of the council website")
+    parser.add_argument("--stream", action="store_true", help="parse each details response while it downloads")
+    args = parser.parse_args()
+
+    with open(args.address_file) as f:
+        addresses = f.readlines()
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    results = scrape_addresses(addresses, args.workers, args.per_host, args.timeout, args.cache_dir, args.base_url, args.stream)
+    failures = 0
+    for address, (dates, error) in results.items():
+        if error is not None:
+            failures += 1
+            print(f"{address}: ERROR {type(error).__name__}: {error}")
+        else:
+            print(f"{address}: " + ", ".join(f"{k} {v:%a %d %b %Y}" for k, v in dates.items()))
+    print(f"{len(results) - failures}/{len(results)} addresses scraped.")
@@ -0,0 +1,140 @@
+import re
+from datetime import date, timedelta
+
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+INTERVAL_WORDS = {"other": 2, "second": 2, "two": 2, "third": 3, "three": 3, "fourth": 4, "four": 4}
+
+# confidence markers, most to least trusted
+SCRAPED = "scraped"    # the date came straight from the council website
+FORECAST = "forecast"  # projected from a cycle a recent scrape agreed with
+STALE = "stale"        # projected, but no scrape has confirmed the cycle for a long time
+
+STALE_AFTER = 8 * 7    # days without a confirming scrape before a forecast is stale
+
+def parse_cycle(text):
+    # "Every Tuesday" -> (1, 1), "Every other Tuesday" / "Every 2 weeks on Tuesday" -> (2, 1)
+    # returns (interval_weeks, weekday index) or None if the text isn't understood
+    if not text:
+        return None
+    weekday = re.search(r'\b(' + "|".join(WEEKDAYS) + r')', text, flags=re.I)
+    if not weekday or not re.search(r'\bevery\b', text, flags=re.I):
+        return None
+    interval = 1
+    m = re.search(r'\bevery\s+(\d+|' + "|".join(INTERVAL_WORDS) + r')\b', text, flags=re.I)
+    if m:
+        word = m.group(1).lower()
+        interval = int(word) if word.isdigit() else INTERVAL_WORDS[word]
+    if interval < 1:
+        return None
+    return interval, WEEKDAYS.index(weekday.group(1).capitalize())
+
+class CollectionForecast:
+    # projects each bin's collection dates from the last scraped date and its collection cycle
+    # {bin: {"anchor": regular collection day, "interval_weeks": n, "confirmed": last agreeing scrape day}}
+    def __init__(self, stale_after=STALE_AFTER):
+        self.stale_after = stale_after
+        self.bins = {}
+        self.mismatches = 0
+
+    def reconcile(self, bin_dates, cycles, scraped_on):
+        # fold a scrape into the forecast, returns [(bin, forecast date, scraped date)] for every disagreement
+        disagreements = []
+        for bin, scraped in bin_dates.items():
+            cycle = parse_cycle(cycles.get(bin))
+            entry = self.bins.get(bin)
+            agrees = True
+            if entry:
+                predicted = self.next_on_or_after(entry, scraped_on)
+                if predicted != scraped:
+                    agrees = False
+                    disagreements.append((bin, predicted, scraped))
+            if cycle is None:
+                # no cycle text this time: keep a forecast the scrape agrees with, drop one it doesn't
+                if entry and agrees:
+                    entry["confirmed"] = scraped_on
+                elif entry:
+                    del self.bins[bin]
+                continue
+            interval, weekday = cycle
+            # anchor on the regular weekday of the scraped week, so a one-off holiday
+            # shift doesn't move every later collection with it
+            anchor = scraped - timedelta(days=scraped.weekday() - weekday)
+            self.bins[bin] = {"anchor": anchor, "interval_weeks": interval, "confirmed": scraped_on}
+        self.mismatches += len(disagreements)
+        return disagreements
+
+    def next_on_or_after(self, entry, day):
+        period = 7 * entry["interval_weeks"]
+        cycles_ahead = -(-(day - entry["anchor"]).days // period) # ceiling division
+        return entry["anchor"] + timedelta(days=cycles_ahead * period)
+
+    def confidence(self, bin, today):
+        entry = self.bins.get(bin)
+        if not entry:
+            return None
+        if (today - entry["confirmed"]).days > self.stale_after:
+            return STALE
+        return FORECAST
+
+    def project(self, bin, start, end):
+        # every forecast collection of one bin between start and end (inclusive)
+        entry = self.bins.get(bin)
+        if not entry:
+            return []
+        dates = []
+        day = self.next_on_or_after(entry, start)
+        while day <= end:
+            dates.append(day)
+            day += timedelta(days=7 * entry["interval_weeks"])
+        return dates
+
+    def calendar(self, start, weeks=26):
+        # {date: [bins]} for the months ahead, e.g. to print or plan scrapes against
+        end = start + timedelta(weeks=weeks)
+        days = {}
+        for bin in self.bins:
+            for day in self.project(bin, start, end):
+                days.setdefault(day, []).append(bin)
+        return dict(sorted(days.items()))
+
+    def next_dates(self, today, scraped=None, allow_stale=False):
+        # {bin: (date, confidence)}: scraped dates that are still ahead of us, otherwise the forecast
+        scraped = scraped or {}
+        result = {}
+        for bin in list(scraped) + [b for b in self.bins if b not in scraped]:
+            if bin in scraped and scraped[bin] >= today:
+                result[bin] = (scraped[bin], SCRAPED)
+                continue
+            confidence = self.confidence(bin, today)
+            if confidence == FORECAST or (confidence == STALE and allow_stale):
+                result[bin] = (self.next_on_or_after(self.bins[bin], today), confidence)
+            elif bin in scraped:
+                # past date and no usable forecast, keep what we had
+                result[bin] = (scraped[bin], SCRAPED)
+        return result
+
+    def to_json(self):
+        return {bin: {k: v.isoformat() if isinstance(v, date) else v for k, v in entry.items()}
+                for bin, entry in self.bins.items()}
+
+    def load_json(self, bins):
+        self.bins = {bin: {"anchor": date.fromisoformat(entry["anchor"]),
+                           "interval_weeks": entry["interval_weeks"],
+                           "confirmed": date.fromisoformat(entry["confirmed"])}
+                     for bin, entry in bins.items()}
+
+    def is_fresh(self, today, max_age):
+        # every bin confirmed by a scrape within max_age days
+        return bool(self.bins) and all((today - entry["confirmed"]).days < max_age for entry in self.bins.values())
+
+# Main execution
+if __name__ == '__main__':
+    # project the collections of a saved details page six months ahead
+    import webparser
+    with open('scraped_source.htm') as f:
+        source = f.read()
+    dates, cycles = webparser.parse_bin_table_with_cycles(source)
+    forecast = CollectionForecast()
+    forecast.reconcile(webparser.parse_dates(dates), cycles, date.today())
+    for day, bins in forecast.calendar(date.today()).items():
+        print(f"{day:%a %d %b %Y}: {', '.join(bins)}")
@@ -0,0 +1,331 @@
+import gzip
+import logging
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
+
+QUEUE_SIZE = 10000    # records held while the writer catches up
+RESERVE = 1000        # of those, kept free for WARNING and above
+BATCH_SIZE = 200      # records written between flushes
+FLUSH_INTERVAL = 2.0  # seconds a written record may wait for its flush
+FLUSH_LEVEL = logging.ERROR # records at or above this are flushed straight away
+STALL_TIME = 0.5      # seconds, a flush slower than this counts as a stall
+
+# archive of rotated daily logs
+RETENTION_DAYS = 180             # days a finished log is kept
+ARCHIVE_MAX_BYTES = 100 * 2**20  # all logs together, oldest deleted first beyond this
+COMPRESS_LEVEL = 6
+DEBUG_RING_BYTES = 5 * 2**20     # each of the two files of the debug ring
+
+ARCHIVE_SUFFIX = re.compile(r"^(\d{4}-\d{2}-\d{2})(\.gz)?$")
+
+_STOP = object()
+
+class DeferredFlushMixin:
+    # file handler that skips its per-record flush while a QueuedLogHandler batches for it
+    deferred = False
+
+    def flush(self):
+        if not self.deferred:
+            super().flush()
+
+    def flush_batch(self):
+        super().flush()
+
+class BatchedTimedRotatingFileHandler(DeferredFlushMixin, TimedRotatingFileHandler):
+    pass
+
+class BatchedRotatingFileHandler(DeferredFlushMixin, RotatingFileHandler):
+    pass
+
+def while_debugging(record):
+    # filter for a debug-only handler: passes records logged while the root logger was at DEBUG
+    return getattr(record, "debug_window", logging.getLogger().level <= logging.DEBUG)
+
+def archive_files(path):
+    # [(day, file path)] of the rotated logs of `path` (name.YYYY-MM-DD, optionally .gz), oldest first
+    directory, name = os.path.split(os.path.abspath(path))
+    files = []
+    for entry in os.listdir(directory):
+        if not entry.startswith(name + "."):
+            continue
+        m = ARCHIVE_SUFFIX.match(entry[len(name) + 1:])
+        if m:
+            files.append((datetime.strptime(m.group(1), "%Y-%m-%d").date(), os.path.join(directory, entry)))
+    return sorted(files)
+
+def compress(path, level=COMPRESS_LEVEL):
+    # path -> path.gz, written under a temporary name so a power cut can't leave half an archive
+    tmp_path = path + ".gz.tmp"
+    with open(path, "rb") as src, gzip.open(tmp_path, "wb", compresslevel=level) as dst:
+        shutil.copyfileobj(src, dst, 2**16)
+    os.replace(tmp_path, path + ".gz")
+    os.remove(path)
+
+class ArchivingFileHandler(BatchedTimedRotatingFileHandler):
+    """
+    Daily rotating log whose finished files are gzipped on a background thread, then pruned:
+    files older than retention_days go, then the oldest until all the logs (today's included)
+    fit in max_bytes. The writer thread only renames the file at midnight.
+    """
+    def __init__(self, filename, retention_days=RETENTION_DAYS, max_bytes=ARCHIVE_MAX_BYTES, compresslevel=COMPRESS_LEVEL, **kwargs):
+        kwargs["backupCount"] = 0 # retention is done by sweep()
+        super().__init__(filename, **kwargs)
+        self.retention_days = retention_days
+        self.max_bytes = max_bytes
+        self.compresslevel = compresslevel
+        self.archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-archive")
+        self.compressed = 0
+        self.deleted = 0
+        # catch up on anything left by a restart or an older version
+        self.archiver.submit(self.sweep)
+
+    def doRollover(self):
+        super().doRollover()
+        self.archiver.submit(self.sweep)
+
+    def sweep(self):
+        try:
+            self._sweep()
+        except Exception:
+            logging.getLogger(__name__).exception("Log archive sweep failed.")
+
+    def _sweep(self):
+        log = logging.getLogger(__name__)
+        directory = os.path.dirname(self.baseFilename)
+        for entry in os.listdir(directory):
+            if entry.endswith(".gz.tmp"):
+                os.remove(os.path.join(directory, entry)) # interrupted compression, the original is still there
+        today = date.today()
+        for day, path in archive_files(self.baseFilename):
+            if (today - day).days > self.retention_days:
+                os.remove(path)
+                self.deleted += 1
+            elif not path.endswith(".gz"):
+                compress(path, self.compresslevel)
+                self.compressed += 1
+        files = [(day, path, os.path.getsize(path)) for day, path in archive_files(self.baseFilename)]
+        current = os.path.getsize(self.baseFilename) if os.path.exists(self.baseFilename) else 0
+        total = current + sum(size for *_, size in files)
+        while files and total > self.max_bytes:
+            day, path, size = files.pop(0)
+            os.remove(path)
+            self.deleted += 1
+            total -= size
+            log.warning("Log archive over its %d byte budget, deleted the log of %s.", self.max_bytes, day)
+
+    def archive_bytes(self):
+        return sum(os.path.getsize(path) for _, path in archive_files(self.baseFilename))
+
+    def close(self):
+        self.archiver.shutdown(wait=True)
+        super().close()
+
+class QueuedLogHandler(logging.Handler):
+    """
+    Root handler that never blocks the logging thread: records go on a bounded queue and
+    one writer thread passes them to the target handlers, flushing once per batch of
+    batch_size records, after flush_interval seconds, or at once for flush_level and above.
+    When the queue is full (the card has stalled) records are dropped and counted, DEBUG and
+    INFO first: the last `reserve` places are kept for warnings and errors. The writer logs
+    what was dropped once the queue has drained.
+    """
+    def __init__(self, targets, queue_size=QUEUE_SIZE, reserve=RESERVE, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, flush_level=FLUSH_LEVEL, stall_time=STALL_TIME):
+        super().__init__()
+        self.targets = list(targets)
+        for target in self.targets:
+            target.deferred = True
+        self.queue = queue.Queue(queue_size)
+        self.capacity = queue_size
+        self.reserve = min(reserve, queue_size - 1)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.flush_level = flush_level
+        self.stall_time = stall_time
+        # enqueue side counted under counts_lock, write side on the writer thread only
+        self.counts_lock = threading.Lock()
+        self.enqueued = 0
+        self.dropped = {}        # levelname -> records dropped
+        self.dropped_reported = 0
+        self.written = 0
+        self.flushes = 0
+        self.flush_max = 0.0
+        self.flush_last = 0.0
+        self.stalls = 0
+        self.queue_max = 0
+        self.thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+        self.thread.start()
+
+    def handle(self, record):
+        # no handler lock, the queue does the locking: logging.shutdown holds the handler lock
+        # while close() waits for the writer and archiver, which may log themselves
+        rv = self.filter(record)
+        if rv:
+            self.emit(record)
+        return rv
+
+    def emit(self, record):
+        try:
+            # merge the arguments now, they may have changed by the time the writer formats it
+            record.message = record.getMessage()
+            record.msg = record.message
+            record.args = None
+            # the level may have been reverted by the time the writer gets to it, see while_debugging
+            record.debug_window = logging.getLogger().level <= logging.DEBUG
+        except Exception:
+            self.handleError(record)
+            return
+        depth = self.queue.qsize()
+        if record.levelno < logging.WARNING and depth >= self.capacity - self.reserve:
+            self._drop(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop(record)
+            return
+        with self.counts_lock:
+            self.enqueued += 1
+            self.queue_max = max(self.queue_max, depth + 1)
+
+    def _drop(self, record):
+        with self.counts_lock:
+            self.dropped[record.levelname] = self.dropped.get(record.levelname, 0) + 1
+
+    def dropped_counts(self):
+        with self.counts_lock:
+            return dict(self.dropped)
+
+    def dropped_total(self):
+        return sum(self.dropped_counts().values())
+
+    def _run(self):
+        pending = 0
+        first_pending = 0.0
+        while True:
+            timeout = max(0.0, first_pending + self.flush_interval - time.monotonic()) if pending else None
+            try:
+                record = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                record = None
+            if record is _STOP:
+                break
+            if record is not None:
+                self._write(record)
+                if not pending:
+                    first_pending = time.monotonic()
+                pending += 1
+                if self.queue.empty():
+                    self._report_dropped()
+                if (pending < self.batch_size and record.levelno < self.flush_level
+                        and time.monotonic() - first_pending < self.flush_interval):
+                    continue
+            if pending:
+                self._flush()
+                pending = 0
+        # drain whatever was queued before close()
+        while True:
+            try:
+                record = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if record is not _STOP:
+                self._write(record)
+        self._report_dropped()
+        self._flush()
+
+    def _write(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+        self.written += 1
+
+    def _report_dropped(self):
+        counts = self.dropped_counts()
+        dropped = sum(counts.values())
+        if dropped == self.dropped_reported:
+            return
+        counts = ", ".join(f"{n} {level}" for level, n in sorted(counts.items()))
+        record = logging.LogRecord("logpipe", logging.WARNING, __file__, 0,
+                                   "Log queue overflowed, %d records dropped (%s in total).",
+                                   (dropped - self.dropped_reported, counts), None)
+        self.dropped_reported = dropped
+        self._write(record)
+
+    def _flush(self):
+        start = time.perf_counter()
+        for target in self.targets:
+            getattr(target, "flush_batch", target.flush)()
+        self.flush_last = time.perf_counter() - start
+        self.flush_max = max(self.flush_max, self.flush_last)
+        self.flushes += 1
+        if self.flush_last > self.stall_time:
+            self.stalls += 1
+
+    def stats(self):
+        return {
+            "queued": self.queue.qsize(),
+            "queue_max": self.queue_max,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped_total(),
+            "flushes": self.flushes,
+            "flush_last": self.flush_last,
+            "flush_max": self.flush_max,
+            "stalls": self.stalls,
+        }
+
+    def close(self):
+        # write out everything queued, then close the targets (also run by logging.shutdown at exit)
+        if self.thread.is_alive():
+            self.queue.put(_STOP)
+            self.thread.join()
+        for target in self.targets:
+            target.deferred = False
+            target.close()
+        super().close()
+
+# Main execution
+if __name__ == '__main__':
+    # hot-path cost of a log call through the queue, against a slow (stalling) target
+    import os
+    import tempfile
+
+    class SlowHandler(DeferredFlushMixin, logging.FileHandler):
+        def flush_batch(self):
+            time.sleep(0.05) # an SD card taking its time
+            super().flush_batch()
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.log")
+    target = SlowHandler(path)
+    target.setFormatter(logging.Formatter("%(asctime)s %(levelname)s: %(message)s"))
+    handler = QueuedLogHandler([target], queue_size=5000, reserve=500, batch_size=100, flush_interval=0.5)
+    log = logging.getLogger("bench")
+    log.propagate = False
+    log.addHandler(handler)
+    log.setLevel(logging.DEBUG)
+
+    calls = 50000
+    worst = 0.0
+    start = time.perf_counter()
+    for i in range(calls):
+        t = time.perf_counter()
+        log.debug("Queue lengths: %d %d %d", i, i % 7, i % 3)
+        worst = max(worst, time.perf_counter() - t)
+    elapsed = time.perf_counter() - start
+    log.warning("Benchmark finished.")
+    handler.close()
+    stats = handler.stats()
+    with open(path) as f:
+        lines = f.readlines()
+    print(f"{calls} debug calls: mean {elapsed / calls * 1e6:.1f} us, worst {worst * 1e3:.2f} ms")
+    print(f"written {stats['written']}, dropped {stats['dropped']}, {stats['flushes']} flushes "
+          f"(max {stats['flush_max'] * 1e3:.1f} ms), {len(lines)} lines in file")
+    print("last line:", lines[-1].strip())
@@ -0,0 +1,241 @@
+import argparse
+import gzip
+import math
+import os
+import re
+import sys
+from datetime import date, datetime
+
+import metrics
+from logpipe import archive_files
+
+DEFAULT_LOG = "/home/pi/logs/bin.log" if os.path.isdir("/home/pi/logs") else "./logs/bin.log"
+CHUNK = 2**20 # bytes read at a time, compressed or not
+
+# "%(asctime)s %(levelname)s: %(message)s", continuation lines (tracebacks, scrape traces) don't match
+LINE = re.compile(rb"(\d{4}-\d{2}-\d{2}) (\d{2}:\d{2}:\d{2},\d{3}) ([A-Z]+): ")
+# the messages counted, matched against the message part of the line in one go
+EVENTS = re.compile(
+    rb"(?P<scrape_start>Starting web scrape\.)"
+    rb"|(?P<scrape_success>Successfully finished web scrape\.)"
+    rb"|(?P<scrape_failure>Fatal error in scraper(?: at (?P<step>\w+))?)"
+    rb"|(?P<retry>Rescheduling web scrape)"
+    rb"|(?P<scrape_skipped>Forecast is fresh and no collection is due tomorrow)"
+    rb"|(?P<scrape_unchanged>Scraped page unchanged)"
+    rb"|(?P<timings>Scrape timings: (?P<timing_list>.*)\.$)"
+    rb"|(?P<alert>System Alert Level has increased to Level (?P<level>\d+))"
+    rb"|(?P<gesture>Single tap|Double tap|Long press|Extra long press)\.$"
+    rb"|(?P<soft_reset>Soft reset\.)"
+    rb"|(?P<launch>Application launched\.)"
+    rb"|(?P<log_dropped>Log queue overflowed, (?P<dropped>\d+))"
+)
+TIMING = re.compile(rb"(\w+) (\d+) ms")
+
+GESTURES = {b"Single tap": "single", b"Double tap": "double", b"Long press": "long", b"Extra long press": "extra_long"}
+COUNTS = ("launches", "scrapes", "succeeded", "failed", "retries", "skipped", "unchanged",
+          "alerts", "single", "double", "long", "extra_long", "soft_resets", "errors", "dropped")
+
+def window_key(day, window):
+    if window == "day":
+        return day.isoformat()
+    if window == "week":
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}"
+    if window == "month":
+        return f"{day:%Y-%m}"
+    if window == "quarter":
+        return f"{day.year}-Q{(day.month - 1) // 3 + 1}"
+    return "all"
+
+def read_lines(path, chunk=CHUNK):
+    # lines of a log, gzipped or plain, read a chunk at a time
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as f:
+        tail = b""
+        while True:
+            data = f.read(chunk)
+            if not data:
+                break
+            lines = (tail + data).split(b"\n")
+            tail = lines.pop()
+            yield from lines
+        if tail:
+            yield tail
+
+def log_files(path, since=None, until=None):
+    # rotated days (oldest first, skipping those outside since / until), then the current log
+    files = [p for day, p in archive_files(path) if (since is None or day >= since) and (until is None or day <= until)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+class Window:
+    # counters and duration histograms of one time window, a fixed size however many lines fed it
+    def __init__(self):
+        self.counts = dict.fromkeys(COUNTS, 0)
+        self.max_alert = 0
+        self.scrape_seconds = metrics.Histogram(metrics.SCRAPE_BUCKETS)
+
+class LogReport:
+    """One pass over the log lines, counting per window: scrapes and their outcomes / durations,
+    retries, alert level rises, button gestures, soft resets, launches, errors and dropped records."""
+    def __init__(self, window="month", since=None, until=None):
+        self.window = window
+        self.since = since
+        self.until = until
+        self.windows = {}
+        self.keys = {}  # date text -> (date, window key), one entry per day seen
+        self.failed_steps = {}
+        self.step_ms = {} # request step -> Histogram of its time, in seconds
+        self.scrape_started = None
+        self.lines = 0
+        self.records = 0
+
+    def _key(self, day_text):
+        entry = self.keys.get(day_text)
+        if entry is None:
+            day = date.fromisoformat(day_text.decode())
+            entry = self.keys[day_text] = (day, window_key(day, self.window))
+        return entry
+
+    def feed_file(self, path):
+        for line in read_lines(path):
+            self.feed(line)
+
+    def feed(self, line):
+        self.lines += 1
+        m = LINE.match(line)
+        if not m:
+            return
+        day, key = self._key(m.group(1))
+        if (self.since and day < self.since) or (self.until and day > self.until):
+            return
+        self.records += 1
+        w = self.windows.get(key)
+        if w is None:
+            w = self.windows[key] = Window()
+        counts = w.counts
+        if m.group(3) in (b"ERROR", b"CRITICAL"):
+            counts["errors"] += 1
+        e = EVENTS.match(line, m.end())
+        if not e:
+            return
+        event = e.lastgroup
+        if event == "scrape_start":
+            counts["scrapes"] += 1
+            self.scrape_started = (m.group(1), m.group(2))
+        elif event == "scrape_success":
+            counts["succeeded"] += 1
+            self._scrape_finished(w, m)
+        elif event == "scrape_failure":
+            counts["failed"] += 1
+            step = (e.group("step") or b"unknown").decode()
+            self.failed_steps[step] = self.failed_steps.get(step, 0) + 1
+            self._scrape_finished(w, m)
+        elif event == "retry":
+            counts["retries"] += 1
+        elif event == "scrape_skipped":
+            counts["skipped"] += 1
+        elif event == "scrape_unchanged":
+            counts["unchanged"] += 1
+        elif event == "timings":
+            for step, ms in TIMING.findall(e.group("timing_list")):
+                step = step.decode()
+                histogram = self.step_ms.get(step)
+                if histogram is None:
+                    histogram = self.step_ms[step] = metrics.Histogram(metrics.SCRAPE_BUCKETS)
+                histogram.observe(int(ms) / 1000)
+        elif event == "alert":
+            counts["alerts"] += 1
+            w.max_alert = max(w.max_alert, int(e.group("level")))
+        elif event == "gesture":
+            counts[GESTURES[e.group("gesture")]] += 1
+        elif event == "soft_reset":
+            counts["soft_resets"] += 1
+        elif event == "launch":
+            counts["launches"] += 1
+            self.scrape_started = None # a scrape cut short by a restart has no end
+        elif event == "log_dropped":
+            counts["dropped"] += int(e.group("dropped"))
+
+    def _scrape_finished(self, w, m):
+        if self.scrape_started is None:
+            return
+        start = datetime.strptime(b" ".join(self.scrape_started).decode(), "%Y-%m-%d %H:%M:%S,%f")
+        end = datetime.strptime((m.group(1) + b" " + m.group(2)).decode(), "%Y-%m-%d %H:%M:%S,%f")
+        w.scrape_seconds.observe((end - start).total_seconds())
+        self.scrape_started = None
+
+    def rows(self):
+        # [(window key, counts, max alert level, success rate, p50, p95)] in time order
+        rows = []
+        for key, w in sorted(self.windows.items()):
+            finished = w.counts["succeeded"] + w.counts["failed"]
+            rate = w.counts["succeeded"] / finished if finished else None
+            rows.append((key, w.counts, w.max_alert, rate, quantile(w.scrape_seconds, 0.5), quantile(w.scrape_seconds, 0.95)))
+        return rows
+
+def quantile(histogram, q):
+    # upper bound of the bucket holding the q quantile, None when empty, inf past the last bucket
+    cumulative, _, count = histogram.snapshot()
+    if not count:
+        return None
+    for bound, c in zip(histogram.buckets, cumulative):
+        if c >= q * count:
+            return bound
+    return math.inf
+
+def format_seconds(value):
+    if value is None:
+        return "-"
+    if value == math.inf:
+        return f">{metrics.SCRAPE_BUCKETS[-1]:g}s"
+    return f"<={value:g}s"
+
+def print_report(report, out=sys.stdout):
+    header = ("window", "launch", "scrapes", "ok", "fail", "ok%", "retry", "skip", "same", "p50", "p95",
+              "alerts", "max", "tap", "2tap", "long", "xlong", "reset", "errors", "dropped")
+    widths = [max(10, len(window_key(date.today(), report.window)))] + [len(h) + 1 for h in header[1:]]
+    widths[header.index("p50")] = widths[header.index("p95")] = 7
+    print(" ".join(h.rjust(w) if i else h.ljust(w) for i, (h, w) in enumerate(zip(header, widths))), file=out)
+    for key, counts, max_alert, rate, p50, p95 in report.rows():
+        cells = [key, counts["launches"], counts["scrapes"], counts["succeeded"], counts["failed"],
+                 "-" if rate is None else f"{rate * 100:.0f}", counts["retries"], counts["skipped"], counts["unchanged"],
+                 format_seconds(p50), format_seconds(p95), counts["alerts"], max_alert,
+                 counts["single"], counts["double"], counts["long"], counts["extra_long"],
+                 counts["soft_resets"], counts["errors"], counts["dropped"]]
+        print(" ".join(str(c).rjust(w) if i else str(c).ljust(w) for i, (c, w) in enumerate(zip(cells, widths))), file=out)
+    if report.failed_steps:
+        print("Failed scrapes by step: " + ", ".join(f"{step} {n}" for step, n in sorted(report.failed_steps.items())), file=out)
+    for step, histogram in sorted(report.step_ms.items()):
+        _, total, count = histogram.snapshot()
+        print(f"Request {step}: {count} timed, mean {total / count * 1000:.0f} ms, "
+              f"p50 {format_seconds(quantile(histogram, 0.5))}, p95 {format_seconds(quantile(histogram, 0.95))}", file=out)
+
+def print_csv(report, out=sys.stdout):
+    print(",".join(("window",) + COUNTS + ("max_alert", "success_rate", "p50_seconds", "p95_seconds")), file=out)
+    for key, counts, max_alert, rate, p50, p95 in report.rows():
+        values = [counts[c] for c in COUNTS] + [max_alert] + ["" if v is None else v for v in (rate, p50, p95)]
+        print(",".join([key] + [str(v) for v in values]), file=out)
+
+# Main execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Scrape, alert, button and reset statistics from the rotated bin.log archive.")
+    parser.add_argument("--log", default=DEFAULT_LOG, help="current log file, its rotated (and gzipped) days are read too")
+    parser.add_argument("--window", choices=("day", "week", "month", "quarter", "all"), default="month")
+    parser.add_argument("--since", type=date.fromisoformat, default=None, metavar="YYYY-MM-DD")
+    parser.add_argument("--until", type=date.fromisoformat, default=None, metavar="YYYY-MM-DD")
+    parser.add_argument("--csv", action="store_true", help="one CSV row per window instead of a table")
+    args = parser.parse_args()
+
+    report = LogReport(args.window, args.since, args.until)
+    files = log_files(args.log, args.since, args.until)
+    if not files:
+        sys.exit(f"No logs found at {args.log}")
+    for path in files:
+        report.feed_file(path)
+    if args.csv:
+        print_csv(report)
+    else:
+        print_report(report)
+        print(f"{len(files)} files, {report.lines} lines, {report.records} records.")
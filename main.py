@@ -1,12 +1,17 @@
 # -------------- Standard libraries -----------------
+import asyncio
 import heapq
+import itertools
 import threading
 import time
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, time as dt_time
 import tomllib
+import json
 import logging
-from logging.handlers import TimedRotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
 import os
+import queue
+import sys
 
 # ---- GPIO library with mock for PC development ----
 try:
@@ -20,7 +25,10 @@ except ImportError:
 # ---------------- Custom Packages -------------------
 import scraper
 import webparser
-from LEDcontroller import LEDcontroller
+import forecast
+import metrics
+import logpipe
+from LEDcontroller import LEDcontroller, AsyncLEDcontroller
 import LEDpatterns
 
 # ------------- Configuration variables --------------
@@ -30,143 +38,675 @@ with open("config.toml", "rb") as f:
 START_BIN_SCHEDULE = CONFIG["display_on"]
 STOP_BIN_SCHEDULE = CONFIG["display_off"]
 WEB_SCRAPE_SCHEDULE = CONFIG["poll_web"]
+SCRAPE_BASE_URL = CONFIG.get("scrape_base_url") # None: the council website
+PARSER_BACKEND = CONFIG.get("parser_backend", webparser.PARSER_BACKEND)
+STREAM_DETAILS = CONFIG.get("stream_details", False)
+SCRAPE_CAPTURE = CONFIG.get("scrape_capture", "") # raw exchange of a failed scrape, for replay
+FORECAST_MAX_AGE = CONFIG.get("forecast_max_age", 0) # days, 0: scrape every day
+COLLECTION_STORE = CONFIG.get("collection_store", "collections.json") # parsed dates kept across restarts
 
 BIN_COLOURS = {k: tuple(v) for k, v in CONFIG["bin_colours"].items()}
 
+# scheduler worker threads, and when a backed up lane raises the alert level
+IO_WORKERS = CONFIG.get("io_workers", 2)
+QUICK_WORKERS = CONFIG.get("quick_workers", 2)
+LANE_QUEUE_LIMIT = 5 # jobs waiting for a worker
+LANE_WAIT_LIMIT = 5  # seconds the last job waited for a worker
+
+# "threads": scheduler, LED controllers and button timers on their own threads
+# "asyncio": all of them as tasks on one event loop, blocking jobs in the io worker pool
+RUNTIME = CONFIG.get("runtime", "threads")
+
+# Prometheus text export: local HTTP endpoint (port 0 to disable) and a periodic snapshot file ("" to disable)
+# the endpoint is unauthenticated, so it listens on loopback unless metrics_host says otherwise
+METRICS_HOST = CONFIG.get("metrics_host", "127.0.0.1")
+METRICS_PORT = CONFIG.get("metrics_port", 0)
+METRICS_SNAPSHOT = CONFIG.get("metrics_snapshot", "")
+METRICS_SNAPSHOT_PERIOD = CONFIG.get("metrics_snapshot_period", 60) # seconds
+
+# queued log writer
+LOG_QUEUE_SIZE = CONFIG.get("log_queue_size", logpipe.QUEUE_SIZE)
+LOG_BATCH_SIZE = CONFIG.get("log_batch_size", logpipe.BATCH_SIZE)
+LOG_FLUSH_INTERVAL = CONFIG.get("log_flush_interval", logpipe.FLUSH_INTERVAL) # seconds
+LOG_RETENTION_DAYS = CONFIG.get("log_retention_days", logpipe.RETENTION_DAYS)
+LOG_MAX_MB = CONFIG.get("log_max_mb", logpipe.ARCHIVE_MAX_BYTES / 2**20) # all of bin.log*
+DEBUG_LOG_MB = CONFIG.get("debug_log_mb", logpipe.DEBUG_RING_BYTES / 2**20) # each of debug.log, debug.log.1
+
 SHORT_TIMEOUT = CONFIG["short_timeout"]
 LONG_TIMEOUT = CONFIG["long_timeout"]
 
+# ---------------- Clock ----------------
+class SystemClock:
+    # wall clock and monotonic time for the scheduler and jobs, simulate.py swaps in a virtual clock
+    def now(self):
+        return datetime.now()
+
+    def monotonic(self):
+        return time.monotonic()
+
+clock = SystemClock()
+
+def monotonic_at(when):
+    # clock.monotonic() seconds of a naive local wall clock time, DST changes included
+    return clock.monotonic() + when.timestamp() - clock.now().timestamp()
+
 # ---------- User input control class ---------------
 class ButtonHandler:
-    def __init__(self, PIN, single_fun=None, double_fun=None, long_fun=None, extra_long_fun=None, DOUBLE_TAP_TIME=0.3, LONG_HOLD_TIME=0.5, EXTRA_LONG_HOLD_TIME=1.5):
+    # gesture recogniser driven by timestamped edges: a single thread waits on the edge
+    # queue until the next deadline, so nothing polls the pin while the button is held
+    GESTURES = {"single": "Single tap.", "double": "Double tap.", "long": "Long press.", "extra_long": "Extra long press."}
+
+    def __init__(self, PIN, single_fun=None, double_fun=None, long_fun=None, extra_long_fun=None, DOUBLE_TAP_TIME=0.3, LONG_HOLD_TIME=0.5, EXTRA_LONG_HOLD_TIME=1.5, start=True):
         self.PIN = PIN
         self.DOUBLE_TAP_TIME = DOUBLE_TAP_TIME
         self.LONG_HOLD_TIME = LONG_HOLD_TIME
         self.EXTRA_LONG_HOLD_TIME = EXTRA_LONG_HOLD_TIME
-        self.last_press_time = 0
-        self.single_timer = None
-        self.single_handler = single_fun
-        self.double_handler = double_fun
-        self.long_handler = long_fun
-        self.extra_long_handler = extra_long_fun
+        self.handlers = {"single": single_fun, "double": double_fun, "long": long_fun, "extra_long": extra_long_fun}
+        # "idle", "down" (first press), "released" (first tap, waiting for a second),
+        # "holding" (past LONG_HOLD_TIME) or "ignore" (second press of a double tap)
+        self.state = "idle"
+        self.press_time = 0
+        self.deadline = None # when the current state times out, None for never
+        self.edges = None
+        # gesture -> [count, total latency, max latency], latency from the moment the
+        # gesture was decided (edge or deadline) to its handler being dispatched
+        self.latency = {}
+        self.latency_histograms = {gesture: metrics.REGISTRY.histogram("bins_button_gesture_latency_seconds",
+                                                                        "Time from a gesture being decided to its handler being dispatched.", gesture=gesture)
+                                   for gesture in self.GESTURES}
+        self.handler_executor = None
+        if start:
+            self.edges = queue.Queue()
+            # handlers may block (show_next_bin, soft_reset), keep them off the recogniser
+            self.handler_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="button")
+            threading.Thread(target=self._run, daemon=True).start()
 
     def edge_detected(self, channel):
-        if GPIO.input(channel) == GPIO.HIGH:
-            self.button_pressed()
-        else:
-            self.button_released()
-    
-    def button_pressed(self):
-        press_time = time.monotonic()
-        delta = press_time - self.last_press_time
-
-        if delta < self.DOUBLE_TAP_TIME:
-            if self.single_timer:
-                self.single_timer.cancel()
-            if self.double_handler:
-                logger.info("Double tap.")
-                self.double_handler()
+        # called from the GPIO library's thread, timestamped here so queueing delays don't skew gestures
+        edge = (clock.monotonic(), GPIO.input(channel) == GPIO.HIGH)
+        if self.edges is None:
+            # no recogniser thread (start=False): recognise in the caller, deadlines via advance()
+            self.feed_edge(*edge)
         else:
-            self.press_start_time = press_time
-            # schedule long-hold check
-            threading.Timer(self.LONG_HOLD_TIME, self.check_hold, [press_time]).start()
-            # schedule single-press detection unless another tap arrives
-            self.single_timer = threading.Timer(self.DOUBLE_TAP_TIME, self.single_hander_wrapper)
-            if self.single_handler:
-                self.single_timer.start()
-
-        self.last_press_time = press_time
-
-    def single_hander_wrapper(self):
-        logger.info("Single tap.")
-        self.single_handler()
-
-    def button_released(self):
-        self.press_start_time = 0
-
-    def check_hold(self, start_time):
-        # if button still held after LONG_HOLD_TIME, it's a long hold
-        if GPIO.input(self.PIN) == GPIO.HIGH and self.press_start_time == start_time:
-            while GPIO.input(self.PIN) == GPIO.HIGH:
-                # hold program in loop while button held
-                time.sleep(0.01)
-            release_time = time.monotonic()
-            if release_time - self.last_press_time > self.EXTRA_LONG_HOLD_TIME:
-                if self.extra_long_handler:
-                    logger.info("Extra long press.")
-                    self.extra_long_handler()
+            self.edges.put(edge)
+
+    def _run(self):
+        while True:
+            timeout = None if self.deadline is None else max(0.0, self.deadline - clock.monotonic())
+            try:
+                t, pressed = self.edges.get(timeout=timeout)
+            except queue.Empty:
+                self.advance(clock.monotonic())
+                continue
+            self.feed_edge(t, pressed)
+
+    def feed_edge(self, t, pressed):
+        self.advance(t)
+        if pressed:
+            if self.state == "idle":
+                self.press_time = t
+                self.state = "down"
+                self.deadline = t + self.LONG_HOLD_TIME
+            elif self.state == "released":
+                # second press inside the double tap window
+                self.state = "ignore"
+                self.deadline = None
+                self.recognised("double", t)
+            # any other press is contact bounce
+        elif self.state == "down":
+            if t - self.press_time < self.DOUBLE_TAP_TIME:
+                # wait out the rest of the double tap window
+                self.state = "released"
+                self.deadline = self.press_time + self.DOUBLE_TAP_TIME
             else:
-                if self.long_handler:
-                    logger.info("Long press.")
-                    self.long_handler()
+                self.state = "idle"
+                self.deadline = None
+                self.recognised("single", t)
+        elif self.state == "holding":
+            self.state = "idle"
+            self.recognised("extra_long" if t - self.press_time > self.EXTRA_LONG_HOLD_TIME else "long", t)
+        elif self.state == "ignore":
+            self.state = "idle"
+
+    def advance(self, now):
+        # act on a deadline that has passed by `now`
+        if self.deadline is None or self.deadline > now:
+            return
+        deadline = self.deadline
+        self.deadline = None
+        if self.state == "down":
+            # still held after LONG_HOLD_TIME, long or extra long is decided on release
+            self.state = "holding"
+        elif self.state == "released":
+            # no second tap
+            self.state = "idle"
+            self.recognised("single", deadline)
+
+    def recognised(self, gesture, decided_at):
+        latency = max(0.0, clock.monotonic() - decided_at)
+        stats = self.latency.setdefault(gesture, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += latency
+        stats[2] = max(stats[2], latency)
+        self.latency_histograms[gesture].observe(latency)
+        logger.info(self.GESTURES[gesture])
+        logger.debug("Gesture %r dispatched %.1f ms after it was decided.", gesture, latency * 1000)
+        if self.handlers[gesture]:
+            self.run_handler(self.handlers[gesture])
+
+    def gesture_stats(self):
+        # {gesture: (count, mean latency, max latency)}, seconds
+        return {gesture: (count, total / count, worst) for gesture, (count, total, worst) in self.latency.items()}
+
+    def run_handler(self, handler):
+        if self.handler_executor:
+            self.handler_executor.submit(handler)
+        else:
+            handler()
+
+class AsyncButtonHandler(ButtonHandler):
+    # ButtonHandler for the asyncio runtime: edges are handed to a recogniser task on the
+    # event loop, and the (blocking) handlers run on their own thread as in the threads runtime,
+    # so a handler never ties up (or takes down) an io lane worker the scrapes need
+    def __init__(self, PIN, sched, **kwargs):
+        super().__init__(PIN, start=False, **kwargs)
+        self.sched = sched
+        self.handler_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="button")
+        self.loop = None
+        self.task = None
+
+    def attach(self, loop):
+        # must be called from inside the running loop
+        self.loop = loop
+        self.edges = asyncio.Queue()
+        self.task = loop.create_task(self.run())
+
+    def edge_detected(self, channel):
+        # called from the GPIO library's thread
+        if self.loop:
+            edge = (clock.monotonic(), GPIO.input(channel) == GPIO.HIGH)
+            self.loop.call_soon_threadsafe(self.edges.put_nowait, edge)
+
+    async def run(self):
+        while True:
+            timeout = None if self.deadline is None else max(0.0, self.deadline - clock.monotonic())
+            try:
+                t, pressed = await asyncio.wait_for(self.edges.get(), timeout)
+            except asyncio.TimeoutError:
+                self.advance(clock.monotonic())
+                continue
+            self.feed_edge(t, pressed)
 
 # -------------- Scheduler class---------------------
+SCHEDULER_MAX_SLEEP = 60 # seconds, longest wait before the wall clock is rechecked
+HEARTBEAT_PERIOD = 10 # seconds
+SAME_DAY_TOGGLE_PERIOD = 10 # seconds between bins while two are due on the same day
+
+# worker lanes: "io" for jobs that block (network, long sleeps), "quick" for short housekeeping
+IO_LANE = "io"
+QUICK_LANE = "quick"
+
+class Interval:
+    # recurrence every `seconds`, counted from a monotonic base so neither clock steps
+    # nor late dispatches accumulate drift; missed runs after a stall are coalesced into one
+    def __init__(self, seconds, start=None):
+        self.seconds = seconds
+        self.base = clock.monotonic() + (start or 0) - seconds
+        self.count = 0
+
+    def first(self):
+        return self.next_time()
+
+    def next_time(self):
+        now = clock.monotonic()
+        due = int((now - self.base) // self.seconds) + 1 # first slot still in the future
+        missed = max(0, due - self.count - 1)
+        self.count = max(self.count + 1, due)
+        return self.base + self.count * self.seconds, missed
+
+    def __repr__(self):
+        return f"every {self.seconds} s"
+
+class DailyAt:
+    # recurrence at the top of `hour` every day, local time
+    def __init__(self, hour):
+        self.hour = hour
+
+    def first(self):
+        return next_schedule_time(self.hour), 0
+
+    def next_time(self):
+        # one fire time per day however long the stall, so missed days are coalesced
+        return next_schedule_time(self.hour), 0
+
+    def __repr__(self):
+        return f"daily at {self.hour:02d}00"
+
+class JobLane:
+    # bounded pool of worker threads for one kind of scheduler job, with queue statistics.
+    # The workers are daemon threads rather than a ThreadPoolExecutor's, which the interpreter
+    # joins at exit: a scrape hung on the network mustn't hold up a Ctrl+C shutdown
+    def __init__(self, name, workers):
+        self.name = name
+        self.workers = workers
+        self.jobs = queue.SimpleQueue() # (submitted, func, args, kwargs), None stops a worker
+        self.threads = [threading.Thread(target=self._worker, name=f"sched-{name}_{i}", daemon=True) for i in range(workers)]
+        for thread in self.threads:
+            thread.start()
+        self.lock = threading.Lock()
+        self.queued = 0     # submitted, waiting for a worker
+        self.running = 0
+        self.completed = 0
+        self.wait_total = 0.0 # seconds between submission and start
+        self.wait_max = 0.0
+        self.wait_last = 0.0
+        self.wait_seconds = metrics.REGISTRY.histogram("bins_scheduler_lane_wait_seconds", "Time scheduler jobs wait for a worker.", lane=name)
+        self.run_seconds = metrics.REGISTRY.histogram("bins_scheduler_job_seconds", "Time scheduler jobs take to run.", lane=name)
+
+    def submit(self, func, args, kwargs):
+        with self.lock:
+            self.queued += 1
+        self.jobs.put((time.monotonic(), func, args, kwargs))
+
+    def _worker(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                break
+            self._run(*job)
+
+    def _run(self, submitted, func, args, kwargs):
+        wait = time.monotonic() - submitted
+        with self.lock:
+            self.queued -= 1
+            self.running += 1
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+            self.wait_last = wait
+        self.wait_seconds.observe(wait)
+        start = time.perf_counter()
+        try:
+            func(*args, **kwargs)
+        except BaseException:
+            # SystemExit too: a worker that died would shrink the lane for good, as would a ThreadPoolExecutor's
+            logger.exception("Scheduler job %s failed in %s lane.", getattr(func, "__name__", func), self.name)
+        finally:
+            self.run_seconds.observe(time.perf_counter() - start)
+            with self.lock:
+                self.running -= 1
+                self.completed += 1
+
+    def stats(self):
+        with self.lock:
+            started = self.completed + self.running
+            return {
+                "queued": self.queued,
+                "running": self.running,
+                "completed": self.completed,
+                "wait_mean": self.wait_total / started if started else 0.0,
+                "wait_max": self.wait_max,
+                "wait_last": self.wait_last,
+            }
+
+    def shutdown(self):
+        # drop the jobs still waiting and stop the workers once their current job is done, without waiting
+        while True:
+            try:
+                job = self.jobs.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                with self.lock:
+                    self.queued -= 1
+        for _ in self.threads:
+            self.jobs.put(None)
+
+class Job:
+    # handle returned by Scheduler.schedule / every / daily_at
+    def __init__(self, sched, func, args, kwargs, lane, recurrence=None, name=None):
+        self.sched = sched
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.lane = lane
+        self.recurrence = recurrence
+        self.name = name
+        self.when = None  # clock.monotonic() seconds it is due at
+        self.wall = None  # local wall clock time it was scheduled for, None for an Interval slot
+        self.entry = None # live [when, seq, job] heap entry, None once run or cancelled
+
+    @property
+    def pending(self):
+        return self.entry is not None
+
+    def cancel(self):
+        # returns False if the job had already run (or been cancelled)
+        return self.sched.cancel(self)
+
+    def reschedule(self, when):
+        self.sched.reschedule(self, when)
+
+    def __repr__(self):
+        at = self.wall or f"{self.when:.1f} s"
+        return f"<Job {self.name or getattr(self.func, '__name__', self.func)} at {at}>"
+
 class Scheduler:
     def __init__(self, status_led_controller, bindicator_led_controller, binSched, binIndicator):
+        # heap of [when, seq, job], when in clock.monotonic() seconds so DST changes and
+        # clock steps don't move interval jobs; cancelled entries stay in place with job set to None
         self.events = []
+        self.wall_offset = None # wall clock minus monotonic seconds, to notice a clock step
+        self.sequence = itertools.count()
+        self.named = {}   # name -> pending Job
+        self.live = 0     # heap entries that haven't been cancelled
         self.lock = threading.Lock()
+        # signalled whenever the earliest deadline moves forward or the scheduler stops
+        self.wakeup = threading.Condition(self.lock)
         self.running = True
         self.statusLED = status_led_controller
         self.binLED = bindicator_led_controller
         self.binSched = binSched
         self.binIndicator = binIndicator
+        self.recurring = 0 # recurring jobs, each always has exactly one heap entry
+        self.lanes = {IO_LANE: JobLane(IO_LANE, IO_WORKERS), QUICK_LANE: JobLane(QUICK_LANE, QUICK_WORKERS)}
+        # dispatch latency (launch time - scheduled time), seconds
+        self.dispatch_count = 0
+        self.dispatch_total = 0.0
+        self.dispatch_max = 0.0
+        self.dispatch_last = 0.0
+        self.dispatch_lag = metrics.REGISTRY.histogram("bins_scheduler_dispatch_lag_seconds", "Time from a job's due time to its launch.")
 
-    def schedule(self, when, func, *args, **kwargs):
+    def schedule(self, when, func, *args, lane=QUICK_LANE, name=None, **kwargs):
+        # a named job replaces any pending job of the same name
         logger.debug("Scheduler adding job.")
+        job = Job(self, func, args, kwargs, lane, name=name)
+        with self.lock:
+            self._add(job, when)
+        return job
+
+    def every(self, seconds, func, *args, start=None, lane=QUICK_LANE, name=None, **kwargs):
+        # run func every `seconds`, first after `start` seconds (default one interval)
+        return self.recur(Interval(seconds, start), func, *args, lane=lane, name=name, **kwargs)
+
+    def daily_at(self, hour, func, *args, lane=QUICK_LANE, name=None, **kwargs):
+        # run func at the top of `hour` every day
+        return self.recur(DailyAt(hour), func, *args, lane=lane, name=name, **kwargs)
+
+    def recur(self, recurrence, func, *args, lane=QUICK_LANE, name=None, **kwargs):
+        logger.debug("Scheduler adding recurring job (%r).", recurrence)
+        job = Job(self, func, args, kwargs, lane, recurrence, name)
+        when, _ = recurrence.first()
         with self.lock:
-            heapq.heappush(self.events, (when, func, args, kwargs))
+            self.recurring += 1
+            self._add(job, when)
+        return job
+
+    def get(self, name):
+        # pending job with this name, or None
+        with self.lock:
+            return self.named.get(name)
+
+    def cancel(self, job):
+        # job handle or name
+        with self.lock:
+            if isinstance(job, str):
+                job = self.named.get(job)
+            if job is None or job.entry is None:
+                return False
+            self._remove(job)
+            if job.recurrence:
+                self.recurring -= 1
+            return True
+
+    def reschedule(self, job, when):
+        # move a job (pending or not) to a new time
+        with self.lock:
+            if job.entry is not None:
+                self._remove(job)
+            elif job.recurrence:
+                self.recurring += 1
+            self._add(job, when)
+
+    def _add(self, job, when):
+        # caller holds self.lock; when is a local wall clock datetime, or clock.monotonic() seconds
+        if isinstance(when, datetime):
+            job.wall = when
+            when = monotonic_at(when)
+        else:
+            job.wall = None
+        if job.name is not None:
+            previous = self.named.get(job.name)
+            if previous is not None and previous is not job:
+                logger.debug("Scheduler replacing pending %r job.", job.name)
+                self._remove(previous)
+                if previous.recurrence:
+                    self.recurring -= 1
+            self.named[job.name] = job
+        job.when = when
+        job.entry = [when, next(self.sequence), job]
+        self.live += 1
+        heapq.heappush(self.events, job.entry)
+        if self.events[0] is job.entry:
+            # new earliest job, cut the current sleep short
+            self.wakeup.notify()
+
+    def _remove(self, job):
+        # caller holds self.lock; lazy deletion, the entry is skipped when it reaches the top
+        job.entry[2] = None
+        job.entry = None
+        self.live -= 1
+        if job.name is not None and self.named.get(job.name) is job:
+            del self.named[job.name]
+        if len(self.events) > 2 * self.live + 16:
+            # mostly dead entries, rebuild the heap
+            self.events = [e for e in self.events if e[2] is not None]
+            heapq.heapify(self.events)
+
+    def _pop_due(self, now):
+        # caller holds self.lock, returns the earliest due job or None
+        while self.events and self.events[0][2] is None:
+            heapq.heappop(self.events)
+        if not self.events or self.events[0][0] > now:
+            return None
+        when, _, job = heapq.heappop(self.events)
+        job.entry = None
+        self.live -= 1
+        if job.name is not None and self.named.get(job.name) is job:
+            del self.named[job.name]
+        return job
+
+    def pending_count(self):
+        with self.lock:
+            return self.live
 
     def stop(self):
         logger.debug("Scheduler stopping.")
-        self.running = False
+        with self.lock:
+            self.running = False
+            self.wakeup.notify()
+        for lane in self.lanes.values():
+            lane.shutdown()
 
     def clearHeap(self):
         logger.debug("Scheduler clearing heap")
         with self.lock:
-            for _ in range(len(self.events)):
-                heapq.heappop(self.events)
+            for entry in self.events:
+                if entry[2] is not None:
+                    entry[2].entry = None
+            self.events = []
+            self.named.clear()
+            self.live = 0
+            self.recurring = 0
 
-    def run(self):
-        while self.running:
-            now = datetime.now()
-            job = None
+    def lane_stats(self):
+        return {name: lane.stats() for name, lane in self.lanes.items()}
 
+    def dispatch_stats(self):
+        # (jobs launched, mean, max, last dispatch latency in seconds)
+        with self.lock:
+            mean = self.dispatch_total / self.dispatch_count if self.dispatch_count else 0.0
+            return self.dispatch_count, mean, self.dispatch_max, self.dispatch_last
+
+    def _next_timeout(self, now):
+        # caller holds self.lock; capped, so a wall clock step (e.g. NTP sync after boot) is noticed
+        timeout = SCHEDULER_MAX_SLEEP
+        if self.events:
+            timeout = min(timeout, self.events[0][0] - now)
+        return timeout
+
+    def _check_clock(self, now):
+        # caller holds self.lock; after a wall clock step, re-convert the jobs set for a wall clock time
+        offset = clock.now().timestamp() - now
+        previous, self.wall_offset = self.wall_offset, offset
+        if previous is None or abs(offset - previous) < 1.0:
+            return
+        logger.warning("Wall clock stepped by %.1f s, rescheduling wall clock jobs.", offset - previous)
+        for job in [e[2] for e in self.events if e[2] is not None and e[2].wall is not None]:
+            self._remove(job)
+            self._add(job, job.wall)
+
+    def _dispatched(self, job, now):
+        # caller holds self.lock; dispatch bookkeeping, returns the latency in seconds
+        latency = now - job.when
+        if job.recurrence:
+            # re-arm before launching, so the recurrence survives the job raising
+            when, missed = job.recurrence.next_time()
+            if missed:
+                logger.warning("Scheduler coalesced %d missed run(s) of %r (%r).", missed, job, job.recurrence)
+            self._add(job, when)
+        self.dispatch_count += 1
+        self.dispatch_total += latency
+        self.dispatch_max = max(self.dispatch_max, latency)
+        self.dispatch_last = latency
+        self.dispatch_lag.observe(max(latency, 0.0))
+        return latency
+
+    def _launch(self, job):
+        self.lanes[job.lane].submit(job.func, job.args, job.kwargs)
+
+    def run(self):
+        while True:
             with self.lock:
-                if self.events and self.events[0][0] <= now:
-                    job = heapq.heappop(self.events)
+                # sleep until the earliest deadline, or until schedule()/stop() signals
+                while self.running:
+                    now = clock.monotonic()
+                    self._check_clock(now)
+                    job = self._pop_due(now)
+                    if job:
+                        break
+                    self.wakeup.wait(self._next_timeout(now))
+                if not self.running:
+                    break
+                latency = self._dispatched(job, now)
+
+            logger.debug("Scheduler launching %r in %s lane (%.1f ms late).", job, job.lane, latency * 1000)
+            self._launch(job)
+
+class AsyncScheduler(Scheduler):
+    # Scheduler driven by a task on an asyncio event loop. Coroutine jobs become tasks,
+    # quick-lane jobs run inline on the loop, io-lane jobs still go to the io worker pool.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.loop = None
+        self.changed = None
+
+    def _add(self, job, when):
+        super()._add(job, when)
+        self._notify()
+
+    def stop(self):
+        super().stop()
+        self._notify()
+
+    def _notify(self):
+        # may be called from any thread
+        if self.loop and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.changed.set)
+
+    def _launch(self, job):
+        if asyncio.iscoroutinefunction(job.func):
+            self.loop.create_task(self._run_coroutine(job))
+        elif job.lane == QUICK_LANE:
+            start = time.perf_counter()
+            try:
+                job.func(*job.args, **job.kwargs)
+            except Exception:
+                logger.exception("Scheduler job %r failed on the event loop.", job)
+            self.lanes[QUICK_LANE].run_seconds.observe(time.perf_counter() - start)
+        else:
+            super()._launch(job)
+
+    async def _run_coroutine(self, job):
+        try:
+            await job.func(*job.args, **job.kwargs)
+        except Exception:
+            logger.exception("Scheduler job %r failed on the event loop.", job)
 
+    async def run_async(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        while True:
+            # cleared before the heap is looked at, so a job added after this wakes the wait below
+            self.changed.clear()
+            with self.lock:
+                if not self.running:
+                    break
+                now = clock.monotonic()
+                self._check_clock(now)
+                job = self._pop_due(now)
+                if job:
+                    latency = self._dispatched(job, now)
+                else:
+                    timeout = self._next_timeout(now)
             if job:
-                _, func, args, kwargs = job
-                logger.debug("Scheduler launching job.")
-                threading.Thread(
-                    target=func, args=args, kwargs=kwargs, daemon=True
-                ).start()
-            else:
-                time.sleep(0.5)
+                logger.debug("Scheduler launching %r in %s lane (%.1f ms late).", job, job.lane, latency * 1000)
+                self._launch(job)
+                await asyncio.sleep(0)
+                continue
+            try:
+                await asyncio.wait_for(self.changed.wait(), max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
 
 # ---------------- Logging ----------------
 logger = logging.getLogger(__name__)
 def setup_logging():
+    # the files are written by one queue writer thread, so a log call never waits on the SD card
     LOG_LEVEL = logging.INFO
-    handler = TimedRotatingFileHandler(
+    handler = logpipe.ArchivingFileHandler(
         filename=LOG_PATH + "bin.log",
-        when="midnight",       # rotate daily
+        retention_days=LOG_RETENTION_DAYS, # keep ~6 months
+        max_bytes=int(LOG_MAX_MB * 2**20),
+        when="midnight",       # rotate daily, finished days are gzipped
         interval=1,
-        backupCount=180,         # keep ~6 months
         encoding="utf-8",
         utc=False
     )
 
     handler.suffix = "%Y-%m-%d"
+    handler.setLevel(LOG_LEVEL) # DEBUG goes to the ring below only
+
+    # debug windows (see Chest.heartbeat) are written, in full, to a ring of two files
+    debug_ring = logpipe.BatchedRotatingFileHandler(
+        filename=LOG_PATH + "debug.log",
+        maxBytes=int(DEBUG_LOG_MB * 2**20),
+        backupCount=1,
+        encoding="utf-8"
+    )
+    debug_ring.addFilter(logpipe.while_debugging)
 
     formatter = logging.Formatter(
         "%(asctime)s %(levelname)s: %(message)s"
     )
     handler.setFormatter(formatter)
+    debug_ring.setFormatter(formatter)
+
+    queued = logpipe.QueuedLogHandler([handler, debug_ring], LOG_QUEUE_SIZE, batch_size=LOG_BATCH_SIZE, flush_interval=LOG_FLUSH_INTERVAL)
 
     root = logging.getLogger()
     root.setLevel(LOG_LEVEL)
-    root.addHandler(handler)
+    root.addHandler(queued)
+    return queued
 
 # -------------- Event Jobs ----------------
 class Chest: 
@@ -182,7 +722,7 @@ class Chest:
             os.remove("/home/pi/logs/debug")
             logging.getLogger().setLevel(logging.DEBUG)
             logger.debug("Entering debug logging from filesystem trigger.")
-            sched.schedule(datetime.now() + timedelta(minutes=LONG_TIMEOUT), revertLoggingLevel)
+            sched.schedule(clock.now() + timedelta(minutes=LONG_TIMEOUT), revertLoggingLevel, name="revert_logging")
 
         oldAlertLevel = self.heartbeatAlertLevel
         self.heartbeatAlertLevel = 0
@@ -193,15 +733,24 @@ class Chest:
             # no available date information
             self.heartbeatAlertLevel = 1
         # check job queue lengths
-        scheulerQueueLength = len(sched.events)
-        statusLEDqueueLength = len(sched.statusLED.jobs)
-        binLEDqueueLength = len(sched.binLED.jobs)
+        scheulerQueueLength = sched.pending_count()
+        statusLEDqueueLength = sched.statusLED.job_count()
+        binLEDqueueLength = sched.binLED.job_count()
+        laneStats = sched.lane_stats()
         logger.debug("Queue lengths: %d %d %d", scheulerQueueLength, statusLEDqueueLength, binLEDqueueLength)
-        if (scheulerQueueLength <= 1 or 
-            scheulerQueueLength > 10 or
+        for name, led in (("status", sched.statusLED), ("bin", sched.binLED)):
+            logger.debug("%s LED PWM writes: %d issued, %d suppressed, %d frames.", name, *led.output_stats())
+        for lane, stats in laneStats.items():
+            logger.debug("Scheduler %s lane: %d queued, %d running, %d done, wait mean %.1f ms, max %.1f ms.",
+                         lane, stats["queued"], stats["running"], stats["completed"], stats["wait_mean"] * 1000, stats["wait_max"] * 1000)
+        dispatched, mean_latency, max_latency, last_latency = sched.dispatch_stats()
+        logger.debug("Scheduler dispatch latency: %d jobs, mean %.1f ms, max %.1f ms, last %.1f ms.",
+                     dispatched, mean_latency * 1000, max_latency * 1000, last_latency * 1000)
+        if (scheulerQueueLength < sched.recurring or
+            any(stats["queued"] > LANE_QUEUE_LIMIT or (stats["queued"] and stats["wait_last"] > LANE_WAIT_LIMIT) for stats in laneStats.values()) or
             statusLEDqueueLength > 10 or
             binLEDqueueLength > 10):
-            # job queue is either too empty or is filling up
+            # recurring jobs have gone missing, or jobs are backing up waiting for a worker
             self.heartbeatAlertLevel = 2
         # call heartbeat LED pattern
         logger.debug("Application alert level: %d", self.heartbeatAlertLevel)
@@ -210,22 +759,20 @@ class Chest:
             # if we are now in a new alert state AND we were not in DEBUG logging level
             logger.warning("System Alert Level has increased to Level %d, entering debug logging for short period.", self.heartbeatAlertLevel)
             logging.getLogger().setLevel(logging.DEBUG)
-            sched.schedule(datetime.now() + timedelta(minutes=SHORT_TIMEOUT), revertLoggingLevel)
-        # reschedule itself
-        time.sleep(1)
-        sched.schedule(datetime.now() + timedelta(seconds=10), self.heartbeat, sched)
+            sched.schedule(clock.now() + timedelta(minutes=SHORT_TIMEOUT), revertLoggingLevel, name="revert_logging")
 
 def manual_debug_logging(sched):
     logging.getLogger().setLevel(logging.DEBUG)
     logger.debug("Entering debug logging from user button trigger.")
-    sched.schedule(datetime.now() + timedelta(minutes=LONG_TIMEOUT), revertLoggingLevel)
+    sched.schedule(clock.now() + timedelta(minutes=LONG_TIMEOUT), revertLoggingLevel, name="revert_logging")
 
 def soft_reset(sched):
     logger.info("Soft reset.")
     sched.statusLED.push_job("reset", 70, lambda led: LEDpatterns.solid_colour(led, (20,0,0)))
     time.sleep(1)
     sched.statusLED.remove_job("reset")
-    quit() # escape python script and rely on Linux system to restart process. Clean state restart.
+    # end the scheduler loop so the main thread exits, and rely on Linux system to restart process. Clean state restart.
+    sched.stop()
     # sched.binIndicator.reset() # reset status of bin indicator
     # # reset scheduler queue
     # sched.clearHeap()
@@ -237,37 +784,169 @@ def soft_reset(sched):
 class binSchedule: # class container for the web-scraper
     def __init__(self):
         self.date_information_int = {}
+        # "Collection cycle" text per bin, and the forecast projected from it
+        self.collection_cycles = {}
+        self.forecast = forecast.CollectionForecast()
+        # pooled session + cached tokens / address ID shared by every scrape
+        self.scrape_context = scraper.ScrapeContext(base_url=SCRAPE_BASE_URL)
+        # digest of the last parsed page, and how often parsing was avoided
+        self.source_digest = None
+        self.parse_skipped = 0
+        self.scrapes_skipped = 0
+        self.scraped_at = None # time of the last successful scrape
+        self.store_path = COLLECTION_STORE
+        self.scrape_outcomes = {outcome: metrics.REGISTRY.counter("bins_scrapes_total", "Scheduled web scrapes by outcome.", outcome=outcome)
+                                for outcome in ("success", "unchanged", "failure", "skipped")}
+        self.scrape_seconds = metrics.REGISTRY.histogram("bins_scrape_seconds", "Time to fetch the details page (and parse it, when streaming).", metrics.SCRAPE_BUCKETS)
+        self.parse_seconds = metrics.REGISTRY.histogram("bins_parse_seconds", "Time to parse the collection table and its dates.")
+
+    def load_store(self):
+        # warm start from the last successful scrape, returns True if there was one
+        if not self.store_path or not os.path.exists(self.store_path):
+            return False
+        try:
+            with open(self.store_path) as f:
+                store = json.load(f)
+            self.date_information_int = {k: datetime.strptime(v, "%Y-%m-%d").date() for k, v in store["dates"].items()}
+            self.collection_cycles = store.get("cycles", {})
+            self.forecast.load_json(store.get("forecast", {}))
+            self.source_digest = store.get("source_digest")
+            self.scraped_at = datetime.fromisoformat(store["scraped_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            logger.warning("Collection store %r unreadable, waiting for a web scrape.", self.store_path)
+            return False
+        logger.info("Loaded %d bin dates from collection store (scraped %s).", len(self.date_information_int), self.scraped_at)
+        return True
+
+    def save_store(self):
+        if not self.store_path:
+            return
+        store = {
+            "dates": {k: v.isoformat() for k, v in self.date_information_int.items()},
+            "cycles": self.collection_cycles,
+            "forecast": self.forecast.to_json(),
+            "source_digest": self.source_digest,
+            "scraped_at": self.scraped_at.isoformat(),
+        }
+        # write atomically so a power cut can't leave a half-written store
+        tmp_path = self.store_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(store, f)
+        os.replace(tmp_path, self.store_path)
+
+    def store_is_fresh(self):
+        # already holding the result of the most recent scheduled poll
+        if self.scraped_at is None or not self.date_information_int:
+            return False
+        return self.scraped_at >= next_schedule_time(WEB_SCRAPE_SCHEDULE) - timedelta(days=1)
+
+    def scrape_needed(self):
+        # scrape when the forecast is old or a collection is due tomorrow (the day the indicator shows it)
+        if not FORECAST_MAX_AGE:
+            return True
+        today = clock.now().date()
+        if not self.forecast.is_fresh(today, FORECAST_MAX_AGE):
+            return True
+        return any((day - today).days <= 1 for day in self.getBinDates().values())
     
+    def fetch_source(self, trace=None):
+        # details page for our address, or its parsed (dates, cycles) when streaming
+        with open("address.txt") as f:
+            return scraper.scrape_bin_date_website(f.readline(), self.scrape_context, STREAM_DETAILS, trace)
+
+    def observe_trace(self, trace, failed=None):
+        # per-request timings, and which step a failed scrape stopped at (failed: that step's span)
+        for span in trace.requests():
+            metrics.REGISTRY.histogram("bins_scrape_request_seconds", "Time taken by each request of the scrape chain.",
+                                       metrics.SCRAPE_BUCKETS, step=span["name"]).observe(span["duration"])
+        if failed:
+            metrics.REGISTRY.counter("bins_scrape_step_failures_total", "Failed scrapes by the step that failed.", step=failed["name"]).inc()
+
     def web_scrape(self, sched):
+        if not self.scrape_needed():
+            self.scrapes_skipped += 1
+            self.scrape_outcomes["skipped"].inc()
+            logger.info("Forecast is fresh and no collection is due tomorrow, skipping web scrape (%d skipped).", self.scrapes_skipped)
+            return
         sched.statusLED.push_job("web_scrape", 10, lambda led: LEDpatterns.web_activity(led))
         logger.info("Starting web scrape.")
+        trace = scraper.ScrapeTrace(capture=bool(SCRAPE_CAPTURE))
+        failed = None
         try:
-            with open("address.txt") as f:
-                source = scraper.scrape_bin_date_website(f.readline())
-            date_information_dict = webparser.parse_bin_table_to_dict(source)
-            self.date_information_int = webparser.parse_dates(date_information_dict)
-            del self.date_information_int["Brown caddy"] # remove the food waste caddy from dictionary
+            start = time.perf_counter()
+            source = self.fetch_source(trace)
+            self.scrape_seconds.observe(time.perf_counter() - start)
+            logger.info("Scrape requests: %d full, %d from cached tokens.", self.scrape_context.full_scrapes, self.scrape_context.cached_scrapes)
+            logger.info("Scrape timings: %s.", trace.brief())
+            logger.debug("Scrape trace:\n%s", trace.summary())
+            if STREAM_DETAILS:
+                # already parsed while the details response downloaded
+                parsed = source
+                digest = webparser.table_digest(parsed)
+            else:
+                parsed = None
+                digest = webparser.source_digest(source)
+            if digest == self.source_digest and self.date_information_int:
+                # same page as last time, keep the existing parsed dates
+                self.parse_skipped += 1
+                outcome = "unchanged"
+                logger.info("Scraped page unchanged, skipped parsing (%d parses skipped).", self.parse_skipped)
+            else:
+                outcome = "success"
+                start = time.perf_counter()
+                if parsed is None:
+                    parsed = webparser.parse_bin_table_with_cycles(source, PARSER_BACKEND)
+                date_information_dict, self.collection_cycles = parsed
+                date_information_int = webparser.parse_dates(date_information_dict)
+                del date_information_int["Brown caddy"] # remove the food waste caddy from dictionary
+                self.date_information_int = date_information_int
+                self.source_digest = digest
+                self.parse_seconds.observe(time.perf_counter() - start)
+            # check the scrape against the forecast, and re-anchor the forecast on it
+            for bin, predicted, scraped in self.forecast.reconcile(self.date_information_int, self.collection_cycles, clock.now().date()):
+                logger.warning("Forecast for %r was %s but website says %s.", bin, predicted, scraped)
+            self.scraped_at = clock.now()
+            try:
+                self.save_store()
+            except OSError:
+                # the scrape itself worked and its dates are in use, only the restart copy is stale
+                logger.exception("Could not save the collection store to %s.", self.store_path)
+            self.scrape_outcomes[outcome].inc()
             logger.info("Successfully finished web scrape.")
             sched.statusLED.push_job("success", 20, lambda led: LEDpatterns.success(led))
-            # reschedule scraping for 12pm
-            logger.info("Rescheduling for web scrape for next scheduled time (%d00).", WEB_SCRAPE_SCHEDULE)
-            sched.schedule(next_schedule_time(WEB_SCRAPE_SCHEDULE), sched.binSched.web_scrape, sched)
         except:
-            logger.error("Fatal error in scraper.")
+            self.scrape_outcomes["failure"].inc()
+            # the step that raised, unless the error came from after the scrape (parsing, the store)
+            failed = trace.failure(sys.exc_info()[1])
+            if failed:
+                logger.error("Fatal error in scraper at %s (%s).", failed["name"], failed["error"])
+            else:
+                logger.exception("Fatal error in scraper.")
+            if trace.spans:
+                logger.warning("Scrape trace:\n%s", trace.summary())
+            if SCRAPE_CAPTURE and trace.exchanges:
+                try:
+                    trace.save_capture(SCRAPE_CAPTURE)
+                    logger.info("Raw scrape exchange saved to %s (replay with scraper.py --replay).", SCRAPE_CAPTURE)
+                except OSError:
+                    logger.exception("Could not save the scrape capture.")
             sched.statusLED.push_job("error", 40, lambda led: LEDpatterns.error(led))
-            # reschedule for 10 minutes time
+            # retry in 30 minutes, the daily poll carries on regardless
             logger.info("Rescheduling web scrape for 30 minutes time.")
-            sched.schedule(datetime.now() + timedelta(minutes=30), sched.binSched.web_scrape, sched)
+            sched.schedule(clock.now() + timedelta(minutes=30), sched.binSched.web_scrape, sched, lane=IO_LANE, name="web_scrape_retry")
+        self.observe_trace(trace, failed)
         sched.statusLED.remove_job("web_scrape")
     
     def getNextBin(self):
         # return list of next bins (to handle corner case of two bins on same day)
-        today_int = datetime.now().date()
-        orderedBins = {k: (v-today_int).days for k, v in sorted(self.date_information_int.items(), key=lambda item: (item[1]-today_int).days)}
+        today_int = clock.now().date()
+        orderedBins = {k: (v-today_int).days for k, v in sorted(self.getBinDates().items(), key=lambda item: (item[1]-today_int).days)}
         return orderedBins
 
     def getBinDates(self):
-        return self.date_information_int
+        # scraped dates, with any that have already passed replaced by the forecast
+        next_dates = self.forecast.next_dates(clock.now().date(), self.date_information_int)
+        return {k: v for k, (v, _) in next_dates.items()}
 
 def show_next_bin(sched):
     logger.info("Show next bin collection.")
@@ -296,10 +975,11 @@ class binIndicatorController: # class container for the bin indicator LED contro
         self.reset()
         self.secondBinSameDayDisplay = False
         self.secondBinSameDayLogged = False
+        self.secondBinSameDayToggling = False
 
     def reset(self):
         self.bin_display_state = True
-        if datetime.now().hour >= START_BIN_SCHEDULE and datetime.now().hour < STOP_BIN_SCHEDULE:
+        if clock.now().hour >= START_BIN_SCHEDULE and clock.now().hour < STOP_BIN_SCHEDULE:
             self.bin_schedule_state = True
         else:
             self.bin_schedule_state = False
@@ -310,17 +990,16 @@ class binIndicatorController: # class container for the bin indicator LED contro
         self.bin_display_state = True
         self.secondBinSameDayLogged = False
         self.update_bin_indicator(sched)
-        time.sleep(10)
-        logger.info("Added scheduled ON time for Bin Indicator to scheduler (%d00).", START_BIN_SCHEDULE)
-        sched.schedule(next_schedule_time(START_BIN_SCHEDULE), self.show_bin_indicator, sched)
 
     def hide_bin_indicator(self, sched):
         logger.info("Scheduled stop time for display")
         self.bin_schedule_state = False
         self.update_bin_indicator(sched)
-        time.sleep(10)
-        logger.info("Added scheduled OFF time for Bin Indicator to scheduler (%d00).", STOP_BIN_SCHEDULE)
-        sched.schedule(next_schedule_time(STOP_BIN_SCHEDULE), self.hide_bin_indicator, sched)
+
+    def same_day_toggle(self, sched):
+        # recurring every SAME_DAY_TOGGLE_PERIOD, swaps the displayed bin while two bins are due on the same day
+        if self.secondBinSameDayToggling:
+            self.update_bin_indicator(sched)
 
     def toggle_bin_display(self, sched):
         self.bin_display_state = not self.bin_display_state
@@ -339,7 +1018,7 @@ class binIndicatorController: # class container for the bin indicator LED contro
             if (orderedBinDict[keyList[0]] == orderedBinDict[keyList[1]]) and (orderedBinDict[keyList[0]] == 1):
                 # if there are two bins on same day
                 if not self.secondBinSameDayLogged:
-                    logger.info("Two bins on same day. Toggling between bins every 10s.")
+                    logger.info("Two bins on same day. Toggling between bins every %ds.", SAME_DAY_TOGGLE_PERIOD)
                     logger.info("Bin name: %r, RGB assigned: %d, %d, %d", keyList[0], BIN_COLOURS[keyList[0]][0], BIN_COLOURS[keyList[0]][1], BIN_COLOURS[keyList[0]][2])
                     logger.info("Bin name: %r, RGB assigned: %d, %d, %d", keyList[1], BIN_COLOURS[keyList[1]][0], BIN_COLOURS[keyList[1]][1], BIN_COLOURS[keyList[1]][2])
                     self.secondBinSameDayLogged = True
@@ -351,15 +1030,18 @@ class binIndicatorController: # class container for the bin indicator LED contro
                     sched.binLED.push_job("scheduled_next_bin", 5, lambda led: LEDpatterns.solid_colour(led, BIN_COLOURS[keyList[0 if self.secondBinSameDayDisplay else 1]]))
                     # toggle the second bin display flag
                     self.secondBinSameDayDisplay = not self.secondBinSameDayDisplay
-                    # reschedule this job for 10s time
-                    sched.schedule(datetime.now() + timedelta(seconds=10), sched.binIndicator.update_bin_indicator, sched)
+                    # keep toggling from the recurring same_day_toggle job
+                    self.secondBinSameDayToggling = True
             elif (orderedBinDict[keyList[0]] == 1):
+                self.secondBinSameDayToggling = False
                 sched.binLED.push_job("scheduled_next_bin", 5, lambda led: LEDpatterns.solid_colour(led, BIN_COLOURS[keyList[0]]))
                 logger.info("Updating Bin Indicator illumination.")
                 logger.info("Bin name: %r, RGB assigned: %d, %d, %d", keyList[0], BIN_COLOURS[keyList[0]][0], BIN_COLOURS[keyList[0]][1], BIN_COLOURS[keyList[0]][2])
             else:
+                self.secondBinSameDayToggling = False
                 logger.info("No bin due tomorrow.")
         else:
+            self.secondBinSameDayToggling = False
             logger.info("Turning off Bin Indicator.")
             sched.binLED.remove_job("scheduled_next_bin")
 
@@ -369,64 +1051,97 @@ def revertLoggingLevel():
     logging.getLogger().setLevel(logging.INFO)
 
 def POST(sched):
-    for h in range(180, 481+360, 2):
-        RGB = HSVtoRGB(h, 1, 1)
-        sched.binLED.push_job("POST", 50, lambda led: LEDpatterns.solid_colour(led, RGB))
-        time.sleep(0.01)
-    sched.binLED.push_job("success", 60, lambda led: LEDpatterns.success(led, 100))
-    sched.binLED.remove_job("POST")
-
-def HSVtoRGB(hue, saturation, value):
-    maxRGB = 100
-    chroma = value * saturation
-    X = chroma * (1 - abs((hue / 60) % 2 - 1))
-    m = value - chroma
-    sector = int(hue // 60) % 6
-    rgb_table = [
-        (chroma, X, 0),  # 0 ≤ H < 60
-        (X, chroma, 0),  # 60 ≤ H < 120
-        (0, chroma, X),  # 120 ≤ H < 180
-        (0, X, chroma),  # 180 ≤ H < 240
-        (X, 0, chroma),  # 240 ≤ H < 300
-        (chroma, 0, X),  # 300 ≤ H < 360
-    ]
-    RGB = (rgb_table[sector])
-    R = (RGB[0] + m) * maxRGB
-    G = (RGB[1] + m) * maxRGB
-    B = (RGB[2] + m) * maxRGB
-    return (R, G, B)
+    # power-on self test, a single precompiled pattern (colour wheel then green flashes)
+    sched.binLED.push_job("POST", 50, LEDpatterns.post)
 
 def next_schedule_time(hour):
-    now = datetime.now()
-    run_at = now.replace(hour=hour, minute=0, second=0)
-    if run_at < now:
-        run_at += timedelta(days=1)
-    return run_at
+    # next top of `hour` in local time, strictly after now
+    now = clock.now()
+    day = now.date()
+    run_at = datetime.combine(day, dt_time(hour))
+    if run_at <= now:
+        run_at = datetime.combine(day + timedelta(days=1), dt_time(hour))
+    # an hour skipped by a DST change (clocks forward) runs at the first time after the gap
+    return datetime.fromtimestamp(run_at.timestamp())
 
 def set_initial_jobs(sched):
-    sched.schedule(datetime.now() + timedelta(seconds=1), chest.heartbeat, sched)
-    logger.info("Added Heartbeat to scheduler.")
-    sched.schedule(datetime.now() + timedelta(seconds=0.9), POST, sched)
+    sched.every(HEARTBEAT_PERIOD, chest.heartbeat, sched, start=1, name="heartbeat")
+    logger.info("Added Heartbeat to scheduler (every %ds).", HEARTBEAT_PERIOD)
+    sched.schedule(clock.now() + timedelta(seconds=0.9), POST, sched)
     logger.info("Added POST to scheduler.")
-    sched.schedule(datetime.now() + timedelta(seconds=6), sched.binSched.web_scrape, sched)
-    logger.info("Added Web Scrape to scheduler.")
-    sched.schedule(datetime.now() + timedelta(seconds=14), sched.binIndicator.update_bin_indicator, sched)
+    if not sched.binSched.store_is_fresh():
+        sched.schedule(clock.now() + timedelta(seconds=6), sched.binSched.web_scrape, sched, lane=IO_LANE)
+        logger.info("Added Web Scrape to scheduler.")
+    else:
+        # dates from the collection store are already up to date, wait for the next regular poll
+        logger.info("Collection store is fresh, skipping start-up Web Scrape.")
+    sched.daily_at(WEB_SCRAPE_SCHEDULE, sched.binSched.web_scrape, sched, lane=IO_LANE)
+    logger.info("Added daily Web Scrape to scheduler (%d00).", WEB_SCRAPE_SCHEDULE)
+    sched.schedule(clock.now() + timedelta(seconds=14), sched.binIndicator.update_bin_indicator, sched, name="update_bin_indicator")
     logger.info("Added Update Bin Indicator to scheduler.")
+    sched.every(SAME_DAY_TOGGLE_PERIOD, sched.binIndicator.same_day_toggle, sched, name="same_day_toggle")
+    logger.info("Added same-day Bin Indicator toggle to scheduler (every %ds).", SAME_DAY_TOGGLE_PERIOD)
 
     # Schedule bin indicator illumination
-    sched.schedule(next_schedule_time(START_BIN_SCHEDULE), sched.binIndicator.show_bin_indicator, sched)
+    sched.daily_at(START_BIN_SCHEDULE, sched.binIndicator.show_bin_indicator, sched)
     logger.info("Added scheduled ON time for Bin Indicator to scheduler (%d00).", START_BIN_SCHEDULE)
-    sched.schedule(next_schedule_time(STOP_BIN_SCHEDULE), sched.binIndicator.hide_bin_indicator, sched)
+    sched.daily_at(STOP_BIN_SCHEDULE, sched.binIndicator.hide_bin_indicator, sched)
     logger.info("Added scheduled OFF time for Bin Indicator to scheduler (%d00).", STOP_BIN_SCHEDULE)
 
+    if METRICS_SNAPSHOT:
+        sched.every(METRICS_SNAPSHOT_PERIOD, metrics.REGISTRY.write_snapshot, METRICS_SNAPSHOT, lane=IO_LANE, name="metrics_snapshot")
+        logger.info("Added metrics snapshot to scheduler (every %ds).", METRICS_SNAPSHOT_PERIOD)
+
     # set default bin illumination (off)
     sched.binLED.push_job("defaultOff", 1, lambda led: LEDpatterns.turn_off(led))
     logger.info("Added default OFF display to Bin Indicator LED to scheduler.")
 
+def register_metrics(sched, log_handler=None):
+    # gauges and counters read from state the application already keeps, at export time
+    registry = metrics.REGISTRY
+    if log_handler is not None:
+        registry.callback("bins_log_queued", "Log records waiting for the writer.", lambda: log_handler.stats()["queued"])
+        registry.callback("bins_log_records_total", "Log records written to the log file.", lambda: log_handler.written, kind="counter")
+        registry.callback("bins_log_dropped_total", "Log records dropped while the log queue was full.", log_handler.dropped_total, kind="counter")
+        registry.callback("bins_log_flush_seconds_max", "Slowest flush of a batch of log records.", lambda: log_handler.flush_max)
+        registry.callback("bins_log_stalls_total", "Log flushes slower than the stall time.", lambda: log_handler.stalls, kind="counter")
+        archive = log_handler.targets[0]
+        registry.callback("bins_log_archive_bytes", "Size of the rotated, compressed logs.", archive.archive_bytes)
+        registry.callback("bins_log_archive_files_total", "Rotated logs compressed or deleted.", lambda: archive.compressed, kind="counter", action="compressed")
+        registry.callback("bins_log_archive_files_total", "Rotated logs compressed or deleted.", lambda: archive.deleted, kind="counter", action="deleted")
+    registry.callback("bins_scheduler_pending_jobs", "Jobs waiting in the scheduler heap.", sched.pending_count)
+    registry.callback("bins_scheduler_recurring_jobs", "Recurring jobs registered.", lambda: sched.recurring)
+    registry.callback("bins_scheduler_dispatched_total", "Jobs launched by the scheduler.", lambda: sched.dispatch_stats()[0], kind="counter")
+    for name, lane in sched.lanes.items():
+        registry.callback("bins_scheduler_lane_queued", "Jobs waiting for a lane worker.", lambda lane=lane: lane.stats()["queued"], lane=name)
+        registry.callback("bins_scheduler_lane_running", "Jobs running on a lane.", lambda lane=lane: lane.stats()["running"], lane=name)
+    for name, led in (("status", sched.statusLED), ("bin", sched.binLED)):
+        registry.callback("bins_led_jobs", "Jobs held by an LED controller.", led.job_count, led=name)
+        registry.callback("bins_led_steps_total", "LED pattern steps taken.", lambda led=led: led.steps, kind="counter", led=name)
+        registry.callback("bins_led_frames_total", "LED frames that changed the output.", lambda led=led: led.output_stats()[2], kind="counter", led=name)
+        registry.callback("bins_led_pwm_writes_total", "PWM channel writes, issued or suppressed as unchanged.",
+                          lambda led=led: led.output_stats()[0], kind="counter", led=name, result="issued")
+        registry.callback("bins_led_pwm_writes_total", "PWM channel writes, issued or suppressed as unchanged.",
+                          lambda led=led: led.output_stats()[1], kind="counter", led=name, result="suppressed")
+    registry.callback("bins_alert_level", "Heartbeat alert level, 0 healthy to 2 serious.", lambda: chest.heartbeatAlertLevel)
+    registry.callback("bins_forecast_mismatches_total", "Scraped dates that disagreed with the forecast.", lambda: sched.binSched.forecast.mismatches, kind="counter")
+    registry.callback("bins_bin_dates", "Bins with a known next collection date.", lambda: len(sched.binSched.getBinDates()))
+
+async def run_asyncio(sched, led_controllers, button_handler):
+    # single event loop for the asyncio runtime: LED stepping, button timers and the scheduler
+    for led in led_controllers:
+        led.start()
+    button_handler.attach(asyncio.get_running_loop())
+    try:
+        await sched.run_async()
+    finally:
+        for led in led_controllers:
+            led.stop()
+
 # ---------------- Main ----------------
 if __name__ == "__main__":
     # configure logging
-    setup_logging()
+    log_handler = setup_logging()
     logger.info("Application launched.")
 
     # --------------- Configure GPIO -------------------
@@ -453,7 +1168,8 @@ if __name__ == "__main__":
         pwm.start(0)
         pwms.append(pwm)
 
-    status_led = LEDcontroller(tuple(pwms), [False, True, False])
+    LEDcontrollerClass = AsyncLEDcontroller if RUNTIME == "asyncio" else LEDcontroller
+    status_led = LEDcontrollerClass(tuple(pwms), [False, True, False])
 
     # bin LED configuration
     pins = (BIN_RED, BIN_GREEN, BIN_BLUE)
@@ -464,35 +1180,52 @@ if __name__ == "__main__":
         pwm.start(0)
         pwms.append(pwm)
 
-    bin_led = LEDcontroller(tuple(pwms))
+    bin_led = LEDcontrollerClass(tuple(pwms))
 
-    # instantiate binSchedule class
+    # instantiate binSchedule class, warm started from the collection store
     binSched = binSchedule()
+    binSched.load_store()
 
     # instantiate binIndicatorController
     binIndicator = binIndicatorController()
 
     # instantiate scheduler class
-    sched = Scheduler(status_led, bin_led, binSched, binIndicator)
+    SchedulerClass = AsyncScheduler if RUNTIME == "asyncio" else Scheduler
+    sched = SchedulerClass(status_led, bin_led, binSched, binIndicator)
 
     # Kick off initial jobs
     chest = Chest()
     set_initial_jobs(sched)
 
+    # metrics export
+    register_metrics(sched, log_handler)
+    if METRICS_PORT:
+        try:
+            metrics_server = metrics.MetricsServer(host=METRICS_HOST, port=METRICS_PORT).start()
+            logger.info("Serving metrics on %s.", metrics_server.url)
+        except OSError:
+            logger.exception("Could not start the metrics endpoint on port %d.", METRICS_PORT)
+
     # button listener
     # Set up event detection for rising / falling edges
     GPIO.add_event_detect(BUTTON_PIN, GPIO.BOTH, bouncetime=10)
-    touch_button_handler = ButtonHandler(PIN=BUTTON_PIN,
-                                          single_fun=lambda: binIndicator.toggle_bin_display(sched),
-                                          double_fun=lambda: show_next_bin(sched),
-                                          long_fun=lambda: soft_reset(sched),
-                                          extra_long_fun=lambda: manual_debug_logging(sched))
+    button_handlers = dict(single_fun=lambda: binIndicator.toggle_bin_display(sched),
+                           double_fun=lambda: show_next_bin(sched),
+                           long_fun=lambda: soft_reset(sched),
+                           extra_long_fun=lambda: manual_debug_logging(sched))
+    if RUNTIME == "asyncio":
+        touch_button_handler = AsyncButtonHandler(BUTTON_PIN, sched, **button_handlers)
+    else:
+        touch_button_handler = ButtonHandler(PIN=BUTTON_PIN, **button_handlers)
     GPIO.add_event_callback(BUTTON_PIN, touch_button_handler.edge_detected)
 
     try:
-        logger.info("Starting scheduler.")
-        sched.run()
+        logger.info("Starting scheduler (%s runtime).", RUNTIME)
+        if RUNTIME == "asyncio":
+            asyncio.run(run_asyncio(sched, (status_led, bin_led), touch_button_handler))
+        else:
+            sched.run()
     except KeyboardInterrupt:
         logger.info("Keyboard interrupt caught, closing application.")
         sched.stop()
-        GPIO.cleanup()
+    GPIO.cleanup()
@@ -0,0 +1,195 @@
+import bisect
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# histogram bucket upper bounds, seconds
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SCRAPE_BUCKETS = (0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+class Counter:
+    """Monotonically increasing value."""
+    kind = "counter"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Gauge:
+    """Value that can go up and down."""
+    kind = "gauge"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        with self.lock:
+            self.value += amount
+
+class Callback:
+    """Counter or gauge whose value is read from func() at export, so the hot path pays nothing."""
+    def __init__(self, kind, func):
+        self.kind = kind
+        self.func = func
+
+    @property
+    def value(self):
+        return self.func()
+
+class Histogram:
+    """Fixed-bucket histogram, observations are counted in the first bucket they fit."""
+    kind = "histogram"
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.lock = threading.Lock()
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1) # last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        # (cumulative bucket counts, sum, count)
+        with self.lock:
+            counts = list(self.counts)
+            total, count = self.sum, self.count
+        cumulative = []
+        running = 0
+        for c in counts:
+            running += c
+            cumulative.append(running)
+        return cumulative, total, count
+
+def format_labels(labels, extra=None):
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{str(v)}"' for k, v in items) + "}"
+
+def format_value(value):
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+class Registry:
+    """Named metric families, each with one metric per label set; exported as Prometheus text."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.families = {} # name -> [kind, help, {sorted label items: metric}]
+
+    def _get(self, name, help, kind, labels, factory):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            family = self.families.setdefault(name, [kind, help, {}])
+            if family[0] != kind:
+                raise ValueError(f"Metric {name!r} is already registered as a {family[0]}")
+            metric = family[2].get(key)
+            if metric is None:
+                metric = family[2][key] = factory()
+            return metric
+
+    def counter(self, name, help, **labels):
+        return self._get(name, help, "counter", labels, Counter)
+
+    def gauge(self, name, help, **labels):
+        return self._get(name, help, "gauge", labels, Gauge)
+
+    def histogram(self, name, help, buckets=LATENCY_BUCKETS, **labels):
+        return self._get(name, help, "histogram", labels, lambda: Histogram(buckets))
+
+    def callback(self, name, help, func, kind="gauge", **labels):
+        # replaces any earlier callback for the same name and labels
+        metric = self._get(name, help, kind, labels, lambda: Callback(kind, func))
+        metric.func = func
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format."""
+        with self.lock:
+            families = [(name, kind, help, list(metrics.items())) for name, (kind, help, metrics) in sorted(self.families.items())]
+        lines = []
+        for name, kind, help, metrics in families:
+            lines.append(f"# HELP {name} {help}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, metric in metrics:
+                if kind == "histogram":
+                    cumulative, total, count = metric.snapshot()
+                    bounds = [format_value(float(bound)) for bound in metric.buckets] + ["+Inf"]
+                    for bound, c in zip(bounds, cumulative):
+                        lines.append(f"{name}_bucket{format_labels(labels, ('le', bound))} {c}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+                    continue
+                try:
+                    value = metric.value
+                except Exception:
+                    continue # a failing callback doesn't take the whole export down
+                lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def write_snapshot(self, path):
+        # atomic, so a scraper of the file (e.g. node_exporter's textfile collector) never sees half of it
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+REGISTRY = Registry()
+
+class MetricsServer:
+    """Serves a registry's Prometheus text on GET /metrics from a daemon thread."""
+    def __init__(self, registry=REGISTRY, host="127.0.0.1", port=9105):
+        self.registry = registry
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/metrics"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self.thread:
+            self.thread.join()
+
+    def _handler_class(self):
+        registry = self.registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        return Handler
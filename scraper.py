@@ -1,57 +1,585 @@
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
+from urllib3 import HTTPResponse
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+import codecs
+import contextlib
 import html
+import io
 import json
+import os
 import re
+import socket
+import threading
+import time
+from urllib.parse import urlsplit
 
-def scrape_bin_date_website(street_address=None):
-    # TODO: think about error handling and return value(s)
+import webparser
+
+URL_STEM = "https://waste.nc.north-herts.gov.uk"
+INPUT_URL = "/w/webpage/find-bin-collection-day-input-address"
+
+# on-disk cache of session tokens and the resolved street address ID
+CACHE_PATH = "scrape_cache.json"
+TOKEN_LIFETIME = 24 * 3600           # seconds, session tokens / cookies
+ADDRESS_ID_LIFETIME = 30 * 24 * 3600 # seconds, street address integer ID
+
+HEADERS = {"X-Requested-With": "XMLHttpRequest"}
+
+REQUEST_TIMEOUT = (10, 30) # seconds, (connect, read)
+MAX_PER_HOST = 2           # concurrent requests allowed to any one host
+STREAM_CHUNK = 2048        # bytes read at a time when streaming the details response
+
+# parts of a traced request, in the order they happen
+TIMINGS = ("wait", "dns", "connect", "tls", "ttfb", "body")
+
+class ScrapeRejected(Exception):
+    # the server did not accept the (cached) tokens, full chain is needed
+    pass
+
+class SiteMaintenance(Exception):
+    # the council website redirected to its maintenance page
+    pass
+
+class ScrapeContext:
+    # persistent state between scrapes: a pooled session plus the tokens and
+    # street address ID needed to skip straight to the submit/redirect/details steps
+    def __init__(self, cache_path=CACHE_PATH, token_lifetime=TOKEN_LIFETIME, address_id_lifetime=ADDRESS_ID_LIFETIME, adapter=None, base_url=None):
+        self.cache_path = cache_path
+        # point at a stand-in server (e.g. MockWasteServer) instead of the council website
+        self.base_url = base_url or URL_STEM
+        self.token_lifetime = token_lifetime
+        self.address_id_lifetime = address_id_lifetime
+        # adapter may be shared between contexts to share its connection pool
+        self.session = new_session(adapter)
+        self.tokens = {}
+        self.address_ids = {}
+        self.full_scrapes = 0
+        self.cached_scrapes = 0
+        self.trace = None # ScrapeTrace of the scrape in progress, if it's being traced
+        self.load()
+
+    def load(self):
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        try:
+            address_ids = {k: v for k, v in cache.get("address_ids", {}).items() if "id" in v and v.get("expires", 0) > now}
+            tokens = cache.get("tokens", {})
+            if tokens.get("expires", 0) > now:
+                self.session.cookies.update(tokens["cookies"])
+            else:
+                tokens = {}
+        except (AttributeError, KeyError, TypeError, ValueError):
+            # malformed (hand edited, or written by another version): start from an empty cache
+            self.session.cookies.clear()
+            return
+        self.address_ids = address_ids
+        self.tokens = tokens
+
+    def save(self):
+        if not self.cache_path:
+            return
+        if self.tokens:
+            self.tokens["cookies"] = requests.utils.dict_from_cookiejar(self.session.cookies)
+        cache = {"tokens": self.tokens, "address_ids": self.address_ids}
+        # write atomically so a power cut can't leave a half-written cache
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    def invalidate(self):
+        # drop the session tokens (and cookies) but keep the address IDs
+        self.tokens = {}
+        self.session.cookies.clear()
+        self.save()
+
+    def get_address_id(self, street_address):
+        entry = self.address_ids.get(street_address)
+        if entry and entry["expires"] > time.time():
+            return entry["id"]
+        return None
+
+    def set_address_id(self, street_address, address_id):
+        self.address_ids[street_address] = {"id": address_id, "expires": time.time() + self.address_id_lifetime}
+
+class JsonFieldStream:
+    # incremental decoder for one top-level string field of a JSON object,
+    # feed() takes text chunks and returns the decoded part of the field they contain
+    ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+    STRING_STOP = re.compile(r'["\\]')
+
+    def __init__(self, field):
+        self.field = field
+        self.found = False      # the field's value has started
+        self.complete = False   # the field's closing quote has been seen
+        self.depth = 0
+        self.expect_key = False
+        self.key = None
+        self.in_string = False
+        self.string_is_key = False
+        self.capture = False
+        self.key_parts = []
+        self.escape = None      # partial escape sequence split across chunks
+        self.high_surrogate = None
+
+    def feed(self, text):
+        out = []
+        i = 0
+        n = len(text)
+        while i < n:
+            if self.escape is not None:
+                i = self.feed_escape(text, i, out)
+            elif self.in_string:
+                m = self.STRING_STOP.search(text, i)
+                j = m.start() if m else n
+                if j > i:
+                    self.emit(text[i:j], out)
+                if not m:
+                    break
+                if text[j] == '"':
+                    self.end_string()
+                else:
+                    self.escape = ""
+                i = j + 1
+            else:
+                self.feed_structure(text[i])
+                i += 1
+        return "".join(out)
+
+    def feed_structure(self, ch):
+        if ch in " \t\r\n":
+            return
+        if self.depth == 0 and ch != "{":
+            raise ValueError("Response is not a JSON object")
+        if ch in "{[":
+            self.depth += 1
+            self.expect_key = self.depth == 1
+        elif ch in "}]":
+            self.depth -= 1
+        elif ch == "," and self.depth == 1:
+            self.expect_key = True
+        elif ch == ":" and self.depth == 1:
+            self.expect_key = False
+        elif ch == '"':
+            self.in_string = True
+            self.string_is_key = self.depth == 1 and self.expect_key
+            self.capture = self.depth == 1 and not self.expect_key and self.key == self.field
+            if self.capture:
+                self.found = True
+        # numbers, true/false/null need no tracking
+
+    def feed_escape(self, text, i, out):
+        # collect "\x" or "\uXXXX" one character at a time, it may straddle chunks
+        self.escape += text[i]
+        i += 1
+        if self.escape[0] == "u":
+            if len(self.escape) < 5:
+                return i
+            code = int(self.escape[1:], 16)
+            self.escape = None
+            if 0xD800 <= code < 0xDC00:
+                self.high_surrogate = code
+                return i
+            if 0xDC00 <= code < 0xE000 and self.high_surrogate is not None:
+                code = 0x10000 + ((self.high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self.high_surrogate = None
+            self.emit(chr(code), out)
+            return i
+        if self.escape not in self.ESCAPES:
+            raise ValueError("Invalid JSON escape \\" + self.escape)
+        self.emit(self.ESCAPES[self.escape], out)
+        self.escape = None
+        return i
+
+    def emit(self, s, out):
+        if self.capture:
+            out.append(s)
+        elif self.string_is_key:
+            self.key_parts.append(s)
+
+    def end_string(self):
+        self.in_string = False
+        if self.string_is_key:
+            self.key = "".join(self.key_parts)
+            self.key_parts = []
+            self.string_is_key = False
+        if self.capture:
+            self.capture = False
+            self.complete = True
+
+# span of the traced request in flight on each thread, found by the connection classes below
+_active = threading.local()
+
+def active_span():
+    return getattr(_active, "span", None)
+
+class ScrapeTrace:
+    # timed spans for one scrape: each request (r0 - r5) with its status, size, redirect target
+    # and wait / DNS / connect / TLS / TTFB / body breakdown, and each extraction step in between.
+    # capture=True also keeps the raw request / response pairs, see save_capture and ReplayAdapter
+    def __init__(self, capture=False):
+        self.origin = time.perf_counter()
+        self.started = time.time()
+        self.spans = []
+        self.raised = [] # (span, exception) in the order the spans raised, innermost first
+        self.capture = capture
+        self.exchanges = []
+        self.street_address = None
+        # cached tokens and address IDs the scrape started from, needed to replay it
+        self.tokens = None
+        self.address_ids = {}
+
+    @contextlib.contextmanager
+    def span(self, name, **attrs):
+        span = {"name": name, "start": time.perf_counter() - self.origin, **attrs}
+        self.spans.append(span)
+        previous = active_span()
+        _active.span = span
+        try:
+            yield span
+        except Exception as e:
+            span["error"] = f"{type(e).__name__}: {e}"
+            self.raised.append((span, e))
+            raise
+        finally:
+            span["duration"] = time.perf_counter() - self.origin - span["start"]
+            _active.span = previous
+
+    def failure(self, exc):
+        # innermost span that raised exc, None when exc didn't come from a traced step
+        return next((span for span, e in self.raised if e is exc and not span.get("recovered")), None)
+
+    def recover(self):
+        # the errors so far were handled and the scrape carried on, e.g. a fallback to the full chain
+        for span, _ in self.raised:
+            span["recovered"] = True
+
+    def requests(self):
+        return [span for span in self.spans if "method" in span]
+
+    def record_response(self, span, r, streamed=False):
+        # status, redirect and time split of a finished request, the body is timed and
+        # counted by the caller when streamed
+        hops = r.history + [r]
+        span["status"] = r.status_code
+        if r.history:
+            span["redirect"] = r.url
+        # requests times each hop up to its response headers, connection setup included
+        headers = sum(hop.elapsed.total_seconds() for hop in hops)
+        setup = sum(span.get(k, 0) for k in ("wait", "dns", "connect", "tls"))
+        span["ttfb"] = max(0.0, headers - setup)
+        if streamed:
+            return
+        span["bytes"] = sum(len(hop.content) for hop in hops)
+        span["body"] = max(0.0, time.perf_counter() - self.origin - span["start"] - headers)
+        for hop in hops:
+            self.capture_exchange(hop, hop.content)
+
+    def capture_exchange(self, r, body):
+        if not self.capture:
+            return
+        request_body = r.request.body or ""
+        if isinstance(request_body, bytes):
+            request_body = request_body.decode("utf-8", "replace")
+        encoding = r.encoding or "utf-8"
+        # the body is stored decoded, so the encoding headers no longer apply
+        headers = {k: v for k, v in r.headers.items() if k.lower() not in ("content-encoding", "transfer-encoding", "content-length")}
+        self.exchanges.append({
+            "request": {"method": r.request.method, "url": r.request.url, "headers": dict(r.request.headers), "body": request_body},
+            "response": {"status": r.status_code, "url": r.url, "headers": headers, "encoding": encoding,
+                         "body": body.decode(encoding, "replace")},
+        })
+
+    def save_capture(self, path):
+        # raw exchange as JSON, holds the session cookies so keep it private
+        capture = {"started": self.started, "street_address": self.street_address, "tokens": self.tokens,
+                   "address_ids": self.address_ids, "spans": self.spans, "exchanges": self.exchanges}
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(capture, f, indent=1)
+        os.replace(tmp_path, path)
+
+    def brief(self):
+        # "r3 210 ms, r4 180 ms, r5 640 ms", the requests only
+        return ", ".join(f"{span['name']} {span['duration'] * 1000:.0f} ms" for span in self.requests())
+
+    def summary(self):
+        # one line per span, times in ms
+        lines = []
+        for span in self.spans:
+            line = f"{span['name']:<14} {span['start'] * 1000:8.1f} +{span['duration'] * 1000:7.1f} ms"
+            if "method" in span:
+                line += f"  {span['method']} {span['path']}"
+            if "status" in span:
+                line += f" HTTP {span['status']}"
+            if "bytes" in span:
+                line += f" {span['bytes']} B"
+            breakdown = ", ".join(f"{k} {span[k] * 1000:.1f}" for k in TIMINGS if k in span)
+            if breakdown:
+                line += f" ({breakdown})"
+            if "method" in span and "connect" not in span and "error" not in span:
+                line += " reused connection"
+            if "redirect" in span:
+                line += f" -> {span['redirect']}"
+            if "error" in span:
+                line += f" FAILED {span['error']}"
+                if span.get("recovered"):
+                    line += " (recovered)"
+            lines.append(line)
+        return "\n".join(lines)
+
+def trace_step(context, name):
+    # span around an extraction step, a no-op when the scrape isn't traced
+    if context.trace is None:
+        return contextlib.nullcontext({})
+    return context.trace.span(name)
+
+def traced_request(context, step, method, url, **kwargs):
+    # session request, recorded as one span when the scrape is traced
+    if context.trace is None:
+        return context.session.request(method, url, **kwargs)
+    with context.trace.span(step, method=method, path=urlsplit(url).path) as span:
+        r = context.session.request(method, url, **kwargs)
+        context.trace.record_response(span, r, streamed=kwargs.get("stream", False))
+        return r
+
+class TimedConnectionMixin:
+    # records DNS lookup and TCP connect times on the active span, new connections only
+    def _new_conn(self):
+        span = active_span()
+        if span is None:
+            return super()._new_conn()
+        start = time.perf_counter()
+        try:
+            addresses = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except OSError:
+            return super()._new_conn() # let urllib3 report the failed lookup
+        resolved = time.perf_counter()
+        span["dns"] = span.get("dns", 0) + resolved - start
+        # connect to the addresses already resolved, in order, rather than look them up again
+        dns_host = self._dns_host
+        error = None
+        try:
+            for *_, sockaddr in addresses:
+                self._dns_host = sockaddr[0]
+                try:
+                    sock = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError) as e:
+                    error = e
+            else:
+                raise error
+        finally:
+            self._dns_host = dns_host
+        self.connected_at = time.perf_counter()
+        span["connect"] = span.get("connect", 0) + self.connected_at - resolved
+        return sock
+
+class TimedHTTPConnection(TimedConnectionMixin, HTTPConnection):
+    pass
+
+class TimedHTTPSConnection(TimedConnectionMixin, HTTPSConnection):
+    connected_at = None
+
+    def connect(self):
+        super().connect()
+        span = active_span()
+        if span is not None and self.connected_at is not None:
+            span["tls"] = span.get("tls", 0) + time.perf_counter() - self.connected_at
+            self.connected_at = None
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = TimedHTTPConnection
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = TimedHTTPSConnection
+
+class ThrottledAdapter(HTTPAdapter):
+    # connection pooling adapter that applies a default timeout and caps the
+    # number of requests in flight to each host
+    def __init__(self, per_host=MAX_PER_HOST, timeout=REQUEST_TIMEOUT, **kwargs):
+        kwargs.setdefault("pool_maxsize", per_host)
+        super().__init__(**kwargs)
+        self.per_host = per_host
+        self.timeout = timeout
+        self.host_limits = {}
+        self.host_limits_lock = threading.Lock()
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # connections that time their setup for a traced scrape
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool, "https": TimedHTTPSConnectionPool}
+
+    def send(self, request, **kwargs):
+        if kwargs.get("timeout") is None:
+            kwargs["timeout"] = self.timeout
+        host = urlsplit(request.url).netloc
+        with self.host_limits_lock:
+            limit = self.host_limits.setdefault(host, threading.BoundedSemaphore(self.per_host))
+        span = active_span()
+        start = time.perf_counter()
+        with limit:
+            if span is not None:
+                span["wait"] = span.get("wait", 0) + time.perf_counter() - start
+            return super().send(request, **kwargs)
+
+class ReplayAdapter(HTTPAdapter):
+    # answers each request with the next response of a captured scrape (ScrapeTrace.save_capture),
+    # to rerun a failed scrape offline, from the same cached tokens / address IDs as the original (see __main__)
+    def __init__(self, exchanges):
+        super().__init__()
+        self.exchanges = list(exchanges)
+        self.position = 0
+
+    def send(self, request, **kwargs):
+        if self.position >= len(self.exchanges):
+            raise requests.ConnectionError("Replay has no more captured responses")
+        captured = self.exchanges[self.position]
+        self.position += 1
+        if request.method != captured["request"]["method"] or urlsplit(request.url).path != urlsplit(captured["request"]["url"]).path:
+            raise requests.ConnectionError(f"Replay expected {captured['request']['method']} {captured['request']['url']}, got {request.method} {request.url}")
+        response = captured["response"]
+        raw = HTTPResponse(body=io.BytesIO(response["body"].encode(response["encoding"])), headers=response["headers"],
+                           status=response["status"], preload_content=False, decode_content=False)
+        return self.build_response(request, raw)
+
+    @classmethod
+    def load(cls, path):
+        # (adapter, capture) for a capture file
+        with open(path) as f:
+            capture = json.load(f)
+        return cls(capture["exchanges"]), capture
+
+def new_session(adapter=None):
     session = requests.Session()
+    if adapter is None:
+        # a single keep-alive connection is all one address needs
+        adapter = ThrottledAdapter(per_host=1, pool_connections=1)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def scrape_bin_date_website(street_address=None, context=None, stream=False, trace=None):
+    # TODO: think about error handling and return value(s)
+    # stream=True parses the details response while it downloads and returns the
+    # webparser.parse_bin_table_with_cycles (dates, cycles) pair instead of the page source
+    # trace: a ScrapeTrace to record every request and extraction step in
+    if context is None:
+        # one-off scrape, nothing persisted
+        context = ScrapeContext(cache_path=None)
+    street_address = street_address.rstrip("\n")
+
+    tokens = context.tokens
+    cached = bool(tokens) and tokens.get("street_address") == street_address
+    if trace is not None:
+        trace.street_address = street_address
+        trace.tokens = dict(tokens) if cached else None
+        trace.address_ids = dict(context.address_ids)
+    context.trace = trace
+    try:
+        if cached:
+            try:
+                scraped_source = fetch_details(context, tokens, stream)
+                context.cached_scrapes += 1
+                context.save() # keep any refreshed cookies
+                return scraped_source
+            except ScrapeRejected:
+                # cached tokens no longer accepted, fall back to the full chain
+                if trace is not None:
+                    trace.recover()
+                context.invalidate()
+
+        context.tokens = fetch_tokens(context, street_address)
+        scraped_source = fetch_details(context, context.tokens, stream)
+        context.full_scrapes += 1
+        context.save()
+        return scraped_source
+    finally:
+        context.trace = None
+
+def fetch_tokens(context, street_address):
+    # r0 - r2: everything needed to submit the address form
+    url_stem = context.base_url
 
     ## Get page (for cookie + webpage_token)
-    url_stem = "https://waste.nc.north-herts.gov.uk"
-    input_url = "/w/webpage/find-bin-collection-day-input-address"
-    r0 = session.get(url_stem+input_url)
+    r0 = traced_request(context, "r0", "GET", url_stem+INPUT_URL)
+
+    ## Check for "page down for maintenance" (redirects to /w/webpage/system-maintenance-page)
+    if "system-maintenance-page" in r0.url:
+        raise SiteMaintenance("Website down for maintenance")
 
-    # TODO: need to check for "page down for maintenance" (redirects to here: https://waste.nc.north-herts.gov.uk/w/webpage/system-maintenance-page)
-    # return status -1?
+    with trace_step(context, "webpage_token"):
+        webpage_token = re.search(r"webpage_token=([a-f0-9]+)", r0.text).group(1)
 
-    webpage_token = re.search(r"webpage_token=([a-f0-9]+)", r0.text).group(1)
-    
     ## Bootstrap POST (for form_check_ajax)
-    headers = {"X-Requested-With": "XMLHttpRequest"}
     payload = {
             "_dummy": "1",
             "_session_storage": '{"_global":{"destination_stack":["w/webpage/find-bin-collection-day-input-address"]}}',
             "_update_page_content_request": "1"
         }
-    r1 = session.post(url_stem+input_url, data=payload, headers=headers)
+    r1 = traced_request(context, "r1", "POST", url_stem+INPUT_URL, data=payload, headers=HEADERS)
 
     ## Extract CSRF from the XHR response
-    CSRF = re.search(r"CSRF = \'([a-fA-F0-9]+)", r1.text).group(1)
+    with trace_step(context, "CSRF"):
+        CSRF = re.search(r"CSRF = \'([a-fA-F0-9]+)", r1.text).group(1)
 
     ## Extract form input fields
-    soup = BeautifulSoup(r1.json()["data"], "html.parser")
-    form_data = {}
-    for inp in soup.find_all("input"):
-        if inp.get("name"):  # only keep inputs with a name
-            form_data[inp["name"]] = inp.get("value", "")
-
-    div = soup.find("div", class_="fragment_presenter_template_edit")
-
-    if div:
-        raw_data_params = div.get("data-params")
-        # Decode HTML entities (&quot; → ")
-        decoded = html.unescape(raw_data_params)
-        # Parse as JSON
-        params = json.loads(decoded)
-        # Extract levels
-        levels = params.get("levels")
-        # print("Levels token:", levels)
+    with trace_step(context, "form"):
+        soup = BeautifulSoup(r1.json()["data"], "html.parser")
+        form_data = {}
+        for inp in soup.find_all("input"):
+            if inp.get("name"):  # only keep inputs with a name
+                form_data[inp["name"]] = inp.get("value", "")
+
+        div = soup.find("div", class_="fragment_presenter_template_edit")
+
+        if div:
+            raw_data_params = div.get("data-params")
+            # Decode HTML entities (&quot; → ")
+            decoded = html.unescape(raw_data_params)
+            # Parse as JSON
+            params = json.loads(decoded)
+            # Extract levels
+            levels = params.get("levels")
+            # print("Levels token:", levels)
+
+    ## Street address ID, only looked up when not already cached
+    street_address_integer_id = context.get_address_id(street_address)
+    if street_address_integer_id is None:
+        street_address_integer_id = fetch_address_id(context, street_address, webpage_token, levels, CSRF)
+        context.set_address_id(street_address, street_address_integer_id)
+
+    ## Update form fields with target address
+    form_data[list(form_data.keys())[-2]] = street_address_integer_id
+
+    ## Form submission target
+    form_attr = soup.find("form").attrs
+    submission_url = form_attr["data-submit_destination"]
 
+    return {
+        "street_address": street_address,
+        "webpage_token": webpage_token,
+        "CSRF": CSRF,
+        "levels": levels,
+        "form_data": form_data,
+        "submission_url": submission_url,
+        "expires": time.time() + context.token_lifetime,
+    }
+
+def fetch_address_id(context, street_address, webpage_token, levels, CSRF):
     ## Duplicate autocomplete request to return an integer ID that's mapped to the street address
     autocomplete_url = "/w/ajax"
-    
+
     params = {
         "webpage_subpage_id": "PAG0000732GBNLM1",
         "webpage_token": webpage_token,
@@ -63,14 +591,14 @@ def scrape_bin_date_website(street_address=None):
         "Accept-Language": "en-GB,en-US;q=0.9,en;q=0.8,vi;q=0.7",
         "Connection": "keep-alive",
         "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-        "Origin": "https://waste.nc.north-herts.gov.uk",
+        "Origin": context.base_url,
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/139.0.0.0 Safari/537.36",
         "X-Requested-With": "XMLHttpRequest",
     }
 
     data = {
         "levels": levels,
-        "search_string": street_address.rstrip("\n"),
+        "search_string": street_address,
         "display_limit": "75",
         "presenter_settings[records_limit]": "75",
         "presenter_settings[load_more_records_label]": "Click here to load more addresses",
@@ -107,24 +635,29 @@ def scrape_bin_date_website(street_address=None):
         "form_check_ajax": CSRF,
     }
 
-    r2 = session.post(url_stem+autocomplete_url, headers=ajax_headers, data=data, params=params)
+    r2 = traced_request(context, "r2", "POST", context.base_url+autocomplete_url, headers=ajax_headers, data=data, params=params)
 
     ## Extract street address ID
-    street_address_integer_id = re.search(r"[0-9]+", r2.text).group(0)
+    with trace_step(context, "address_id"):
+        return re.search(r"[0-9]+", r2.text).group(0)
 
-    ## Update form fields with target address
-    form_data[list(form_data.keys())[-2]] = street_address_integer_id
+def fetch_details(context, tokens, stream=False):
+    # r3 - r5: submit the address form and fetch the collection details
+    url_stem = context.base_url
 
     ## Submit form with new payload
-    form_attr = soup.find("form").attrs
-    submission_url = form_attr["data-submit_destination"]
-
-    r3 = session.post(url_stem+submission_url, data=form_data, headers=headers)
+    r3 = traced_request(context, "r3", "POST", url_stem+tokens["submission_url"], data=tokens["form_data"], headers=HEADERS)
 
-    redirect_url = r3.json()["redirect_url"]
+    with trace_step(context, "redirect_url") as span:
+        try:
+            redirect_url = r3.json()["redirect_url"]
+        except (ValueError, KeyError, TypeError):
+            # expired session / CSRF: the server answers without a redirect
+            raise ScrapeRejected("Form submission rejected (HTTP %d)" % r3.status_code)
+        span["redirect"] = redirect_url
 
     ## Follow redirect
-    r4 = session.post(url_stem+redirect_url, headers=headers)
+    r4 = traced_request(context, "r4", "POST", url_stem+redirect_url, headers=HEADERS)
 
     ## Bootstrap POST
     payload = {
@@ -132,12 +665,87 @@ def scrape_bin_date_website(street_address=None):
             "_session_storage": '{"_global":{"destination_stack":["w/webpage/find-bin-collection-day-show-details"]}}',
             "_update_page_content_request": "1"
         }
-    r5 = session.post(url_stem+redirect_url, data=payload, headers=headers)
+    if stream:
+        return stream_details(context, url_stem+redirect_url, payload)
 
-    scraped_source = r5.json()["data"]
+    r5 = traced_request(context, "r5", "POST", url_stem+redirect_url, data=payload, headers=HEADERS)
+
+    with trace_step(context, "data"):
+        try:
+            scraped_source = r5.json()["data"]
+        except (ValueError, KeyError, TypeError):
+            raise ScrapeRejected("Details request rejected (HTTP %d)" % r5.status_code)
     return scraped_source
 
+def stream_details(context, url, payload):
+    # r5, streamed: the "data" string is decoded from the JSON as it arrives and
+    # fed straight into the table parser, the rest of the body is dropped once the table closes
+    with trace_step(context, "r5") as span:
+        if span:
+            span.update(method="POST", path=urlsplit(url).path)
+        return read_details(context, url, payload, span)
+
+def read_details(context, url, payload, span):
+    r5 = context.session.post(url, data=payload, headers=HEADERS, stream=True)
+    if span:
+        context.trace.record_response(span, r5, streamed=True)
+    decoder = codecs.getincrementaldecoder(r5.encoding or "utf-8")(errors="replace")
+    field = JsonFieldStream("data")
+    parser = webparser.BinTableParser()
+    # body read (and parsed) from here on, kept when capturing
+    body_start = time.perf_counter()
+    received = bytearray() if context.trace is not None and context.trace.capture else None
+    size = 0
+    try:
+        for chunk in r5.iter_content(STREAM_CHUNK):
+            size += len(chunk)
+            if received is not None:
+                received += chunk
+            html_chunk = field.feed(decoder.decode(chunk))
+            if html_chunk:
+                parser.feed(html_chunk)
+            if parser.done or field.complete:
+                break
+    except ValueError:
+        raise ScrapeRejected("Details request rejected (HTTP %d)" % r5.status_code)
+    finally:
+        r5.close()
+        if span:
+            span["bytes"] = size
+            span["body"] = time.perf_counter() - body_start
+        if received is not None:
+            context.trace.capture_exchange(r5, bytes(received))
+    if not field.found:
+        raise ScrapeRejected("Details request rejected (HTTP %d)" % r5.status_code)
+    if not (parser.done or field.complete):
+        raise ScrapeRejected("Details response truncated (HTTP %d)" % r5.status_code)
+    return parser.finish()
+
 # Main execution
 if __name__ == '__main__':
-    with open("address.txt") as f:
-        scrape_bin_date_website(f.readline())
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape the bin collection dates for address.txt, with a timing trace.")
+    parser.add_argument("--base-url", default=None, help="scrape a stand-in server instead of the council website")
+    parser.add_argument("--stream", action="store_true", help="parse the details response while it downloads")
+    parser.add_argument("--capture", default=None, metavar="PATH", help="save the raw requests / responses to PATH")
+    parser.add_argument("--replay", default=None, metavar="PATH", help="rerun a captured scrape offline instead")
+    args = parser.parse_args()
+
+    trace = ScrapeTrace(capture=bool(args.capture))
+    if args.replay:
+        adapter, capture = ReplayAdapter.load(args.replay)
+        context = ScrapeContext(cache_path=None, adapter=adapter, base_url=args.base_url)
+        if capture["tokens"]:
+            context.tokens = capture["tokens"]
+        context.address_ids = capture["address_ids"]
+        street_address = capture["street_address"]
+    else:
+        context = ScrapeContext(base_url=args.base_url)
+        with open("address.txt") as f:
+            street_address = f.readline()
+    try:
+        scrape_bin_date_website(street_address, context, args.stream, trace)
+    finally:
+        print(trace.summary())
+        if args.capture:
+            trace.save_capture(args.capture)
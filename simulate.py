@@ -0,0 +1,308 @@
+import argparse
+import json
+import logging
+import os
+import random
+import time
+from datetime import datetime, timedelta
+from string import Template
+
+# no live bar graph from main's MockGPIO, the LEDs are recorded instead
+os.environ.setdefault("MOCKGPIO_HEADLESS", "1")
+
+import main
+import webparser
+from LEDrender import VirtualClock, VirtualLEDcontroller
+from MockWasteServer import FIXTURE_PATH, WEEKDAYS, next_collection, ordinal
+
+LATE_TOLERANCE = 1.0 # seconds a job may run after its due time before it counts as a missed deadline
+SESSION_GAP = 1.0    # seconds of darkness that still count as one lit session on the LED timeline
+
+class SimClock(VirtualClock):
+    # virtual clock for main.py: seconds since the start of the run, and the local
+    # wall clock that goes with them (DST changes included)
+    def __init__(self, start):
+        super().__init__()
+        self.epoch = start.timestamp()
+
+    def now(self):
+        return self.at(self.seconds)
+
+    def at(self, seconds):
+        return datetime.fromtimestamp(self.epoch + seconds)
+
+    def seconds_at(self, when):
+        # clock seconds of a local wall clock time
+        return when.timestamp() - self.epoch
+
+    def monotonic(self):
+        return self.seconds
+
+class LEDTimeline:
+    # frame_writer for a simulated LED: time lit per colour, and (optionally) the lit sessions
+    def __init__(self, clock, inverted=(False, False, False), keep_sessions=False, trace=None, name=""):
+        self.clock = clock
+        self.inverted = inverted
+        self.keep_sessions = keep_sessions
+        self.trace = trace # open file for a CSV line per frame, or None
+        self.name = name
+        self.frames = 0
+        self.colour = (0, 0, 0)
+        self.since = 0.0
+        self.lit = {}      # colour -> [frames, seconds]
+        self.sessions = [] # [start, end, {colours}]
+
+    def __call__(self, duties):
+        now = self.clock.seconds
+        rgb = tuple(round(100 - d if inv else d, 1) for d, inv in zip(duties, self.inverted))
+        self._close(now)
+        self.frames += 1
+        self.colour = rgb
+        if any(rgb):
+            self.lit.setdefault(rgb, [0, 0.0])[0] += 1
+            if self.keep_sessions:
+                if self.sessions and now - self.sessions[-1][1] <= SESSION_GAP:
+                    self.sessions[-1][2].add(rgb)
+                else:
+                    self.sessions.append([now, now, {rgb}])
+        if self.trace:
+            self.trace.write(f"{self.clock.now().isoformat()},{self.name},{rgb[0]},{rgb[1]},{rgb[2]}\n")
+
+    def _close(self, now):
+        # account the time the current colour was shown
+        if any(self.colour):
+            self.lit[self.colour][1] += now - self.since
+            if self.keep_sessions:
+                self.sessions[-1][1] = now
+        self.since = now
+
+class SimScrapeSource:
+    # stand-in for the council website: the details table MockWasteServer would serve
+    # for the simulated day, with an optional share of scrapes failing
+    def __init__(self, clock, failure_rate=0.0, seed=0):
+        self.clock = clock
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.templates = {}
+        for name in ("details_fragment.html", "details_row.html"):
+            with open(os.path.join(FIXTURE_PATH, name), encoding="utf-8") as f:
+                self.templates[name] = Template(f.read())
+        with open(os.path.join(FIXTURE_PATH, "bins.json"), encoding="utf-8") as f:
+            self.bins = json.load(f)
+        self.scrapes = 0
+        self.failures = 0
+
+    def details(self):
+        today = self.clock.now().date()
+        rows = []
+        for bin_info in self.bins:
+            day = next_collection(bin_info, today)
+            cycle = f"Every {bin_info['weekday']}" if bin_info["interval_weeks"] == 1 else f"Every other {bin_info['weekday']}"
+            rows.append(self.templates["details_row.html"].substitute(
+                icon=bin_info["icon"], label=bin_info["label"],
+                next_collection=f"{WEEKDAYS[day.weekday()]} {ordinal(day.day)} {day:%B %Y}", cycle=cycle))
+        return self.templates["details_fragment.html"].substitute(address="1 Simulated Road", rows="\n".join(rows))
+
+    def __call__(self, trace=None):
+        self.scrapes += 1
+        if self.random.random() < self.failure_rate:
+            self.failures += 1
+            raise ConnectionError("Simulated scrape failure")
+        html = self.details()
+        if main.STREAM_DETAILS:
+            return webparser.parse_bin_table_stream(html)
+        return html
+
+class SimBinSchedule(main.binSchedule):
+    # binSchedule scraping the simulated source and keeping no collection store
+    def __init__(self, source):
+        super().__init__()
+        self.store_path = None
+        self.fetch_source = source
+
+class SimScheduler(main.Scheduler):
+    # Scheduler whose jobs run inline when the simulation loop dispatches them,
+    # tracking how late each job ran against the clock time it was scheduled for
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        for lane in self.lanes.values():
+            lane.shutdown()
+        self.due = {}      # job -> clock seconds it was meant to run at
+        self.runs = {}     # job name -> runs
+        self.missed = []   # (clock seconds, job name, seconds late)
+        self.late_max = 0.0
+        self.depth_max = 0
+        self.depth_total = 0
+
+    def _add(self, job, when):
+        super()._add(job, when)
+        # an Interval keeps to its monotonic slot, anything else to its local wall clock time
+        self.due[job] = when if job.wall is None else main.clock.seconds_at(job.wall)
+
+    def _dispatched(self, job, now):
+        # due time taken before a recurring job is re-armed (and given its next one)
+        self.last_due = self.due.pop(job, main.clock.seconds)
+        return super()._dispatched(job, now)
+
+    def _launch(self, job):
+        name = job.name or getattr(job.func, "__name__", repr(job.func))
+        late = main.clock.seconds - self.last_due
+        self.runs[name] = self.runs.get(name, 0) + 1
+        self.late_max = max(self.late_max, late)
+        if late > LATE_TOLERANCE:
+            self.missed.append((main.clock.seconds, name, late))
+        depth = self.live
+        self.depth_max = max(self.depth_max, depth)
+        self.depth_total += depth
+        started = time.perf_counter()
+        try:
+            job.func(*job.args, **job.kwargs)
+        except Exception:
+            main.logger.exception("Scheduler job %r failed.", job)
+        self.lanes[job.lane].run_seconds.observe(time.perf_counter() - started)
+
+class SimLogHandler(logging.Handler):
+    # counts log records by level and keeps the warnings, stamped with simulated time
+    def __init__(self, clock):
+        super().__init__(logging.WARNING)
+        self.clock = clock
+        self.counts = {}
+        self.warnings = []
+
+    def handle(self, record):
+        self.counts[record.levelname] = self.counts.get(record.levelname, 0) + 1
+        return super().handle(record)
+
+    def emit(self, record):
+        self.warnings.append((self.clock.now(), record.levelname, record.getMessage()))
+
+def simulate(start, days, failure_rate=0.0, seed=0, trace=None, housekeeping=None):
+    # run main.py's wiring over `days` of virtual time from `start`, returns the pieces to report on
+    # housekeeping: seconds between heartbeats / same-day toggles instead of main.py's, to cover long spans quickly
+    if housekeeping:
+        main.HEARTBEAT_PERIOD = main.SAME_DAY_TOGGLE_PERIOD = housekeeping
+    main.METRICS_SNAPSHOT = "" # metrics stay in memory, see --metrics
+    clock = SimClock(start)
+    main.clock = clock
+    end = days * 86400
+
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    log_handler = SimLogHandler(clock)
+    root.addHandler(log_handler)
+
+    timelines = {"status": LEDTimeline(clock, (False, True, False), trace=trace, name="status"),
+                 "bin": LEDTimeline(clock, keep_sessions=True, trace=trace, name="bin")}
+    # the timelines keep what the report needs, a full output trace of a long run would not fit in memory
+    status_led = VirtualLEDcontroller([False, True, False], clock, frame_writer=timelines["status"], record=False)
+    bin_led = VirtualLEDcontroller(clock=clock, frame_writer=timelines["bin"], record=False)
+    leds = (status_led, bin_led)
+    source = SimScrapeSource(clock, failure_rate, seed)
+    binSched = SimBinSchedule(source)
+    sched = SimScheduler(status_led, bin_led, binSched, main.binIndicatorController())
+    main.chest = main.Chest()
+    main.set_initial_jobs(sched)
+    main.register_metrics(sched)
+    wakeups = 0
+    try:
+        while True:
+            # the scheduler's run loop, one iteration per wakeup
+            now = clock.monotonic()
+            with sched.lock:
+                sched._check_clock(now)
+                job = sched._pop_due(now)
+                if job:
+                    sched._dispatched(job, now)
+                else:
+                    timeout = sched._next_timeout(now)
+            if job:
+                sched._launch(job)
+                for led in leds:
+                    led.step_due()
+                continue
+            wakeups += 1
+            next_time = clock.seconds + max(timeout, 0)
+            for led in leds:
+                led_time = led.next_time()
+                if led_time is not None:
+                    next_time = min(next_time, led_time)
+            if next_time >= end:
+                clock.advance_to(end)
+                break
+            clock.advance_to(next_time)
+            for led in leds:
+                led.step_due()
+        for timeline in timelines.values():
+            timeline._close(clock.seconds)
+    finally:
+        root.removeHandler(log_handler)
+    return {"clock": clock, "sched": sched, "binSched": binSched, "source": source, "leds": leds,
+            "timelines": timelines, "log": log_handler, "wakeups": wakeups}
+
+def report(result, elapsed, show_sessions=20, show_warnings=20):
+    clock = result["clock"]
+    sched = result["sched"]
+    binSched = result["binSched"]
+    source = result["source"]
+    print(f"Simulated {clock.seconds / 86400:.1f} days from {clock.at(0):%Y-%m-%d %H:%M} in {elapsed:.2f} s "
+          f"({clock.seconds / max(elapsed, 1e-9):,.0f}x real time)")
+
+    dispatched = sum(sched.runs.values())
+    print(f"\nScheduler: {dispatched} jobs run, {result['wakeups']} idle wakeups, "
+          f"queue depth mean {sched.depth_total / max(dispatched, 1):.1f} max {sched.depth_max}, "
+          f"{sched.pending_count()} pending at the end ({sched.recurring} recurring)")
+    for name, runs in sorted(sched.runs.items(), key=lambda item: -item[1]):
+        print(f"  {name:<24} {runs:>9}")
+    print(f"Missed deadlines (> {LATE_TOLERANCE:g} s late): {len(sched.missed)}, worst {sched.late_max:.1f} s")
+    for seconds, name, late in sorted(sched.missed, key=lambda m: -m[2])[:10]:
+        print(f"  {clock.at(seconds):%Y-%m-%d %H:%M:%S} {name} ran {late:.1f} s late")
+
+    print(f"\nScrapes: {source.scrapes} made ({source.failures} failed), {binSched.scrapes_skipped} skipped, "
+          f"{binSched.parse_skipped} parses skipped, {binSched.forecast.mismatches} forecast mismatches")
+
+    for name, timeline in result["timelines"].items():
+        lit = sum(seconds for _, seconds in timeline.lit.values())
+        print(f"\n{name} LED: {timeline.frames} frames, lit {lit / 3600:.1f} h")
+        for rgb, (frames, seconds) in sorted(timeline.lit.items(), key=lambda item: -item[1][1])[:8]:
+            print(f"  RGB {str(rgb):<20} {frames:>8} frames {seconds / 3600:>9.2f} h")
+        if timeline.keep_sessions:
+            print(f"  {len(timeline.sessions)} lit sessions (gaps under {SESSION_GAP:g} s merged), first {min(show_sessions, len(timeline.sessions))}:")
+            for session_start, session_end, colours in timeline.sessions[:show_sessions]:
+                shown = ", ".join(map(str, sorted(colours)[:3])) + (f" +{len(colours) - 3} more" if len(colours) > 3 else "")
+                print(f"  {clock.at(session_start):%a %Y-%m-%d %H:%M:%S} for "
+                      f"{timedelta(seconds=round(session_end - session_start))}: {shown}")
+
+    log = result["log"]
+    print(f"\nLog records: {', '.join(f'{level} {count}' for level, count in sorted(log.counts.items()))}")
+    for stamp, level, message in log.warnings[:show_warnings]:
+        print(f"  {stamp:%Y-%m-%d %H:%M:%S} {level}: {message}")
+    if len(log.warnings) > show_warnings:
+        print(f"  ... {len(log.warnings) - show_warnings} more")
+
+# Main execution
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the bin indicator's scheduler, jobs and LEDs on a virtual clock.")
+    parser.add_argument("--start", type=datetime.fromisoformat, default=datetime.now().replace(microsecond=0),
+                        help="local start time, ISO format (default now)")
+    parser.add_argument("--days", type=float, default=7)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of scrapes that fail")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--housekeeping", type=float, metavar="SECONDS",
+                        help=f"heartbeat / same-day toggle period (default {main.HEARTBEAT_PERIOD} s as on the device, "
+                             "e.g. 600 to cover a year in seconds)")
+    parser.add_argument("--trace", metavar="CSV", help="write every LED frame to this file")
+    parser.add_argument("--metrics", action="store_true", help="print the metrics export at the end")
+    args = parser.parse_args()
+
+    trace = open(args.trace, "w") if args.trace else None
+    if trace:
+        trace.write("time,led,r,g,b\n")
+    started = time.perf_counter()
+    result = simulate(args.start, args.days, args.failure_rate, args.seed, trace, args.housekeeping)
+    elapsed = time.perf_counter() - started
+    if trace:
+        trace.close()
+    report(result, elapsed)
+    if args.metrics:
+        print()
+        print(main.metrics.REGISTRY.render(), end="")
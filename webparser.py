@@ -1,10 +1,90 @@
+import hashlib
+import json
 import re
 from datetime import datetime
-from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 
-def parse_bin_table_to_dict(html):
+def source_digest(html):
+    # digest of the normalised details fragment, used to skip re-parsing an unchanged page
+    # per-session tokens and whitespace changes don't alter the collection dates
+    normalised = re.sub(r'(webpage_token|form_check_ajax|CSRF)([=:\'" ]+)[A-Za-z0-9]+', r'\1', html)
+    normalised = re.sub(r'\s+', ' ', normalised).strip()
+    return hashlib.sha256(normalised.encode("utf-8")).hexdigest()
+
+# "stream" walks the html.parser event stream without building a tree,
+# "soup" is the original BeautifulSoup implementation (kept as a reference)
+PARSER_BACKEND = "stream"
+PARSER_BACKENDS = ("stream", "soup")
+
+MAX_BINS = 5       # entries kept from the collection table
+FEED_CHUNK = 4096  # characters handed to the stream parser at a time
+
+def parse_bin_table_to_dict(html, backend=None):
+    return parse_bin_table_with_cycles(html, backend)[0]
+
+def parse_bin_table_with_cycles(html, backend=None):
+    # ({bin: "Next collection" text}, {bin: "Collection cycle" text})
+    backend = backend or PARSER_BACKEND
+    if backend == "stream":
+        return parse_bin_table_stream(html)
+    if backend == "soup":
+        return parse_bin_table_soup(html)
+    raise ValueError(f"Unknown parser backend {backend!r}, expected one of {PARSER_BACKENDS}")
+
+def compare_backends(html):
+    # parse with every backend, returns {backend: (dates, cycles)} and whether they all agree
+    results = {backend: parse_bin_table_with_cycles(html, backend) for backend in PARSER_BACKENDS}
+    first = results[PARSER_BACKENDS[0]]
+    return results, all(result == first for result in results.values())
+
+def row_pair_entry(cells1, row1_text, row2_text):
+    # (key, date, cycle) from a label row and the "Next collection" row below it
+    # cells1 is the text of each <td> in the label row, row texts are joined with single spaces
+    # Prefer the second <td> in the first row for the bin label
+    if len(cells1) >= 2:
+        bin_label = cells1[1]
+    else:
+        # fallback: any strong/span in the row
+        bin_label = row1_text
+
+    # next row usually contains the "Next collection" / date info
+    date = None
+    cycle = None
+    if row2_text is not None:
+        text = row2_text
+        # Try to capture the text after "Next collection" until "Collection cycle" or end
+        m = re.search(r'Next\s+collection[:\s]*([\s\S]*?)(?:Collection\s+cycle|$)', text, flags=re.I)
+        if m:
+            date = m.group(1).strip()
+            # Clean duplicated whitespace/newline bits
+            date = re.sub(r'\s+', ' ', date)
+        else:
+            # fallback: try to find a weekday + year pattern e.g. "Tuesday 23rd September 2025"
+            m2 = re.search(r'\b(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)\b[^\d\n]*\d{1,2}.*?\d{4}', text, flags=re.I)
+            if m2:
+                date = m2.group(0).strip()
+        # and the text after "Collection cycle", e.g. "Every other Tuesday"
+        m3 = re.search(r'Collection\s+cycle[:\s]*([\s\S]*)$', text, flags=re.I)
+        if m3:
+            cycle = re.sub(r'\s+', ' ', m3.group(1)).strip() or None
+
+    # Normalise the label to a colour if possible (e.g. "Purple lid bin" -> "purple")
+    key = None
+    if bin_label:
+        mcol = re.search(r'([A-Za-z]+)\s+lid', bin_label, flags=re.I)
+        if mcol:
+            key = mcol.group(1).strip().lower()
+        else:
+            # fallback to the whole label (strip/normalise whitespace)
+            key = re.sub(r'\s+', ' ', bin_label).strip()
+    return key, date, cycle
+
+def parse_bin_table_soup(html):
+    # imported here so the stream backend never loads bs4
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html, "html.parser")
     result = {}
+    cycles = {}
 
     # Iterate all tables (works if there's only one table too)
     for table in soup.find_all("table"):
@@ -12,51 +92,135 @@ def parse_bin_table_to_dict(html):
         i = 0
         while i < len(rows):
             row1 = rows[i]
-            # Prefer the second <td> in the first row for the bin label
-            tds1 = row1.find_all("td")
-            bin_label = None
-            if len(tds1) >= 2:
-                bin_label = tds1[1].get_text(" ", strip=True)
-            else:
-                # fallback: any strong/span in the row
-                bin_label = row1.get_text(" ", strip=True)
-
-            # next row usually contains the "Next collection" / date info
-            date = None
-            if i + 1 < len(rows):
-                row2 = rows[i + 1]
-                text = row2.get_text(" ", strip=True)
-                # Try to capture the text after "Next collection" until "Collection cycle" or end
-                m = re.search(r'Next\s+collection[:\s]*([\s\S]*?)(?:Collection\s+cycle|$)', text, flags=re.I)
-                if m:
-                    date = m.group(1).strip()
-                    # Clean duplicated whitespace/newline bits
-                    date = re.sub(r'\s+', ' ', date)
-                else:
-                    # fallback: try to find a weekday + year pattern e.g. "Tuesday 23rd September 2025"
-                    m2 = re.search(r'\b(Monday|Tuesday|Wednesday|Thursday|Friday|Saturday|Sunday)\b[^\d\n]*\d{1,2}.*?\d{4}', text, flags=re.I)
-                    if m2:
-                        date = m2.group(0).strip()
-
-            # Normalise the label to a colour if possible (e.g. "Purple lid bin" -> "purple")
-            key = None
-            if bin_label:
-                mcol = re.search(r'([A-Za-z]+)\s+lid', bin_label, flags=re.I)
-                if mcol:
-                    key = mcol.group(1).strip().lower()
-                else:
-                    # fallback to the whole label (strip/normalise whitespace)
-                    key = re.sub(r'\s+', ' ', bin_label).strip()
+            cells1 = [td.get_text(" ", strip=True) for td in row1.find_all("td")]
+            row2_text = rows[i + 1].get_text(" ", strip=True) if i + 1 < len(rows) else None
+            key, date, cycle = row_pair_entry(cells1, row1.get_text(" ", strip=True), row2_text)
 
             if key and date:
                 result[key] = date
+                if cycle:
+                    cycles[key] = cycle
 
             # Advance: if we used a pair, skip two rows; otherwise move one row forward
             i += 2 if (i + 1 < len(rows)) else 1
 
     # slice dictionary to remove duplicates
-    result = dict(list(result.items())[:5])
-    return result
+    result = dict(list(result.items())[:MAX_BINS])
+    return result, {k: v for k, v in cycles.items() if k in result}
+
+class BinTableParser(HTMLParser):
+    # single pass over the html.parser event stream, collecting the text of each
+    # table row (and of each cell) and pairing rows up as soon as they close
+    def __init__(self, max_bins=MAX_BINS):
+        super().__init__()
+        self.max_bins = max_bins
+        self.result = {}
+        self.cycles = {}
+        self.done = False
+        self.table_depth = 0
+        self.pending = None   # (cells, text) of a label row waiting for its date row
+        self.row = None       # text strings of the open <tr>
+        self.cells = None     # finished <td> texts of the open <tr>
+        self.cell = None      # text strings of the open <td>
+        self.text = []        # character data since the last tag
+
+    def flush_text(self):
+        # one text node, stripped and dropped if empty as get_text(strip=True) does
+        if self.text:
+            s = "".join(self.text).strip()
+            self.text = []
+            if s and self.row is not None:
+                self.row.append(s)
+                if self.cell is not None:
+                    self.cell.append(s)
+
+    def handle_starttag(self, tag, attrs):
+        self.flush_text()
+        if tag == "table":
+            self.table_depth += 1
+        elif tag == "tr" and self.table_depth:
+            self.end_row()
+            self.row, self.cells = [], []
+        elif tag == "td" and self.row is not None:
+            self.end_cell()
+            self.cell = []
+
+    def handle_endtag(self, tag):
+        self.flush_text()
+        if tag == "td":
+            self.end_cell()
+        elif tag == "tr":
+            self.end_row()
+        elif tag == "table" and self.table_depth:
+            self.end_row()
+            self.table_depth -= 1
+            if not self.table_depth:
+                self.end_table()
+
+    def handle_data(self, data):
+        if self.table_depth:
+            self.text.append(data)
+
+    def end_cell(self):
+        if self.cell is not None:
+            self.cells.append(" ".join(self.cell))
+            self.cell = None
+
+    def end_row(self):
+        if self.row is None:
+            return
+        self.end_cell()
+        row = (self.cells, " ".join(self.row))
+        self.row = self.cells = None
+        if self.pending is None:
+            self.pending = row
+        else:
+            self.add_entry(self.pending, row[1])
+            self.pending = None
+
+    def end_table(self):
+        # an unpaired last row is still looked at on its own
+        if self.pending is not None:
+            self.add_entry(self.pending, None)
+            self.pending = None
+        if len(self.result) >= self.max_bins:
+            # later tables can only add entries that would be sliced off
+            self.done = True
+
+    def add_entry(self, label_row, row2_text):
+        key, date, cycle = row_pair_entry(label_row[0], label_row[1], row2_text)
+        if key and date:
+            self.result[key] = date
+            if cycle:
+                self.cycles[key] = cycle
+
+    def finish(self):
+        # end of input: close any open table and return the (dates, cycles) dictionaries
+        if not self.done:
+            self.close()
+            if self.table_depth:
+                # unclosed table at end of document
+                self.table_depth = 0
+                self.end_row()
+                self.end_table()
+        result = dict(list(self.result.items())[:self.max_bins])
+        return result, {k: v for k, v in self.cycles.items() if k in result}
+
+def parse_bin_table_chunks(chunks):
+    # feed an iterable of html text chunks, stopping as soon as the table is done
+    parser = BinTableParser()
+    for chunk in chunks:
+        parser.feed(chunk)
+        if parser.done:
+            break
+    return parser.finish()
+
+def parse_bin_table_stream(html, chunk_size=FEED_CHUNK):
+    return parse_bin_table_chunks(html[i:i + chunk_size] for i in range(0, len(html), chunk_size))
+
+def table_digest(bin_dictionary):
+    # digest of an already parsed table, for when the page source was streamed rather than kept
+    return hashlib.sha256(json.dumps(bin_dictionary, sort_keys=True).encode("utf-8")).hexdigest()
 
 def parse_dates(bin_dictionary):
     # process date strings into integer days from dd/mm/yyyy
@@ -71,8 +235,16 @@ def parse_dates(bin_dictionary):
 
 # Main execution
 if __name__ == '__main__':
+    import sys
     with open('scraped_source.htm') as f:
         source = f.read()
+    if "--check" in sys.argv:
+        # confirm the stream backend matches the BeautifulSoup reference
+        results, agree = compare_backends(source)
+        for backend, result in results.items():
+            print(backend, result)
+        print("Backends agree." if agree else "Backends DISAGREE.")
+        sys.exit(0 if agree else 1)
     source_info = parse_bin_table_to_dict(source)
     # print(source_info)
     processed_dates = parse_dates(source_info)